@@ -0,0 +1,228 @@
+# alerts.py
+from __future__ import annotations
+import signal
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from config import (
+    ALERT_INTERVAL_S,
+    ALERT_PAGES,
+    ALERT_TOP_N,
+    ALERT_PCT_JUMP,
+    ALERT_VOLUME_RATIO,
+    ALERT_MIN_VOLUME,
+    ALERT_DOMINANCE_PP,
+    ALERT_COOLDOWN_S,
+    ALERT_MAX_PER_POST,
+)
+from coingecko_client import MarketSnapshot, get_global, get_markets_pages
+from market_table import MarketTable
+from report_model import Alert
+from metrics import inc, span, serve_metrics
+
+def _pct(p: float) -> str:
+    return f"{'+' if p >= 0 else ''}{p:.2f}%"
+
+def _usd(v: float) -> str:
+    for unit, div in (("B", 1e9), ("M", 1e6), ("K", 1e3)):
+        if abs(v) >= div:
+            return f"${v / div:.1f}{unit}"
+    return f"${v:.0f}"
+
+def strongest_per_coin(alerts: List[Alert]) -> List[Alert]:
+    """One alert per coin (the largest magnitude), so a single move is not posted as both a top mover and a spike."""
+    best: Dict[str, Alert] = {}
+    for a in alerts:
+        k = a.coin_id or a.key  # market-wide alerts (dominance) have no coin
+        if k not in best or a.magnitude > best[k].magnitude:
+            best[k] = a
+    return list(best.values())
+
+class SnapshotDiffer:
+    """
+    Keeps the previous poll's table in memory and diffs each new one against it.
+
+    All comparisons are vectorized over the rows present in both snapshots
+    (aligned by coin id), so a poll costs one pass over the table. The first
+    poll only sets the baseline.
+    """
+
+    def __init__(self, top_n: int = ALERT_TOP_N, pct_jump: float = ALERT_PCT_JUMP,
+                 volume_ratio: float = ALERT_VOLUME_RATIO, min_volume: float = ALERT_MIN_VOLUME,
+                 dominance_pp: float = ALERT_DOMINANCE_PP):
+        self.top_n = top_n
+        self.pct_jump = pct_jump
+        self.volume_ratio = volume_ratio
+        self.min_volume = min_volume
+        self.dominance_pp = dominance_pp
+        self.prev: Optional[MarketTable] = None
+        self._prev_movers: Tuple[set, set] = (set(), set())
+        self._dominance_ref: Optional[float] = None  # level at the last dominance alert (or at start)
+
+    def _movers(self, table: MarketTable) -> Tuple[np.ndarray, np.ndarray]:
+        mask = table.priced() & (table.volume >= self.min_volume)
+        return (table.top_idx(self.top_n, table.pct, largest=True, mask=mask),
+                table.top_idx(self.top_n, table.pct, largest=False, mask=mask))
+
+    def _coin(self, table: MarketTable, i: int) -> str:
+        return f"{table.names[i]} ({table.symbols[i]})"
+
+    def diff(self, table: MarketTable, btc_dominance: Optional[float] = None) -> List[Alert]:
+        alerts: List[Alert] = []
+        g_idx, l_idx = self._movers(table)
+        movers = (set(table.ids[g_idx].tolist()), set(table.ids[l_idx].tolist()))
+
+        prev = self.prev
+        if prev is not None and len(prev) and len(table):
+            # --- new entries into the top movers ---
+            for side, idx, before in (("gainers", g_idx, self._prev_movers[0]), ("losers", l_idx, self._prev_movers[1])):
+                for rank, i in enumerate(idx.tolist(), 1):
+                    cid = table.ids[i]
+                    if cid in before:
+                        continue
+                    alerts.append(Alert(
+                        kind="top_mover", key=f"top_mover:{side}:{cid}", coin_id=cid,
+                        title=self._coin(table, i),
+                        detail=f"new #{rank} in top {side}: {_pct(table.pct[i])} 24h at ${table.price[i]:.6g}",
+                        magnitude=abs(float(table.pct[i])),
+                    ))
+
+            # --- pct / volume spikes vs the previous poll (rows present in both) ---
+            pos = np.fromiter((prev.index.get(cid, -1) for cid in table.ids.tolist()), dtype=np.int64, count=len(table))
+            cur = np.flatnonzero(pos >= 0)
+            old = pos[cur]
+            liquid = table.volume[cur] >= self.min_volume
+
+            jump = table.pct[cur] - prev.pct[old]
+            for j in np.flatnonzero(liquid & (np.abs(jump) >= self.pct_jump)).tolist():
+                i = int(cur[j])
+                up = jump[j] > 0
+                alerts.append(Alert(
+                    kind="pct_spike", key=f"pct_spike:{table.ids[i]}:{'up' if up else 'down'}", coin_id=table.ids[i],
+                    title=self._coin(table, i),
+                    detail=f"24h {_pct(prev.pct[old[j]])} → {_pct(table.pct[i])} since last check",
+                    magnitude=abs(float(jump[j])),
+                ))
+
+            prev_vol = prev.volume[old]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratio = np.where(prev_vol > 0, table.volume[cur] / prev_vol, 0.0)
+            for j in np.flatnonzero(liquid & (ratio >= self.volume_ratio)).tolist():
+                i = int(cur[j])
+                alerts.append(Alert(
+                    kind="volume_spike", key=f"volume_spike:{table.ids[i]}", coin_id=table.ids[i],
+                    title=self._coin(table, i),
+                    detail=f"volume {_usd(prev_vol[j])} → {_usd(table.volume[i])} (x{ratio[j]:.1f}), 24h {_pct(table.pct[i])}",
+                    magnitude=float(ratio[j]) * 10,
+                ))
+
+        # --- BTC dominance shift since the last dominance alert ---
+        if btc_dominance:
+            if self._dominance_ref is None:
+                self._dominance_ref = btc_dominance
+            elif abs(btc_dominance - self._dominance_ref) >= self.dominance_pp:
+                shift = btc_dominance - self._dominance_ref
+                alerts.append(Alert(
+                    kind="dominance_shift", key=f"dominance_shift:{'up' if shift > 0 else 'down'}",
+                    title="BTC dominance",
+                    detail=f"{self._dominance_ref:.2f}% → {btc_dominance:.2f}% ({shift:+.2f} pts)",
+                    magnitude=abs(shift) * 20,
+                ))
+                self._dominance_ref = btc_dominance
+
+        self.prev = table
+        self._prev_movers = movers
+        return strongest_per_coin(alerts)
+
+class AlertGate:
+    """Drops alerts whose key was posted within `cooldown_s`; caps how many go out per post."""
+
+    def __init__(self, cooldown_s: float = ALERT_COOLDOWN_S, max_per_post: int = ALERT_MAX_PER_POST):
+        self.cooldown_s = cooldown_s
+        self.max_per_post = max_per_post
+        self._last: Dict[str, float] = {}
+
+    def filter(self, alerts: List[Alert], now: Optional[float] = None) -> List[Alert]:
+        now = time.time() if now is None else now
+        fresh, seen = [], set()
+        for a in sorted(alerts, key=lambda a: a.magnitude, reverse=True):
+            if a.key in seen or now - self._last.get(a.key, float("-inf")) < self.cooldown_s:
+                inc("alerts_suppressed_total", kind=a.kind)
+                continue
+            seen.add(a.key)
+            fresh.append(a)
+        fresh = fresh[:self.max_per_post]
+        for a in fresh:
+            self._last[a.key] = now
+        # forget expired keys so the map stays small
+        self._last = {k: t for k, t in self._last.items() if now - t < self.cooldown_s}
+        return fresh
+
+class AlertMonitor:
+    """
+    Polling loop: fetch a light snapshot (ALERT_PAGES market pages + /global),
+    diff it, gate it, and only if something is left ask Claude about those
+    deltas and hand them to `publish`.
+    """
+
+    def __init__(self, publish: Callable[[List[Alert]], None],
+                 comment: Optional[Callable[[List[Alert]], List[Alert]]] = None,
+                 interval_s: float = ALERT_INTERVAL_S, pages: int = ALERT_PAGES,
+                 differ: Optional[SnapshotDiffer] = None, gate: Optional[AlertGate] = None):
+        self.publish = publish
+        self.comment = comment
+        self.interval_s = interval_s
+        self.pages = pages
+        self.differ = differ or SnapshotDiffer()
+        self.gate = gate or AlertGate()
+        self._stop = threading.Event()
+
+    def stop(self, *_: object) -> None:
+        self._stop.set()
+
+    def fetch(self) -> Tuple[MarketTable, Optional[float]]:
+        # strict: a page missing from one poll would read as "new" top movers on the next
+        snap = MarketSnapshot(markets=get_markets_pages(pages=self.pages, strict=True), global_data=get_global())
+        d = (snap.global_data or {}).get("data") or {}
+        dominance = (d.get("market_cap_percentage") or {}).get("btc")
+        return snap.table, float(dominance) if dominance else None
+
+    def poll_once(self) -> List[Alert]:
+        with span("alert_poll"):
+            try:
+                table, dominance = self.fetch()
+            except Exception as e:
+                print("Alert poll incomplete, keeping the previous snapshot:", e)
+                inc("alert_polls_skipped_total")
+                return []
+            if not len(table):
+                print("Alert poll got no market data, keeping the previous snapshot")
+                return []
+            alerts = self.gate.filter(self.differ.diff(table, dominance))
+            for a in alerts:
+                inc("alerts_total", kind=a.kind)
+            if alerts and self.comment is not None:
+                alerts = self.comment(alerts)
+            if alerts:
+                self.publish(alerts)
+            return alerts
+
+    def run(self) -> None:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                signal.signal(sig, self.stop)
+            except ValueError:  # not the main thread
+                pass
+        serve_metrics()
+        print(f"🚨 Alert mode: polling every {self.interval_s:.0f}s")
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                sent = self.poll_once()
+                if sent:
+                    print(f"🚨 Posted {len(sent)} alert(s)")
+            except Exception as e:
+                print("Alert poll failed:", e)
+            self._stop.wait(max(0.0, self.interval_s - (time.monotonic() - started)))
+        print("👋 Alert monitor stopped")
@@ -1,15 +1,27 @@
 # analyzer.py
 from __future__ import annotations
 import asyncio
+import contextvars
 import threading
-from typing import Dict, Any, List, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, List, Optional, Tuple
 from coingecko_client import (
-    get_top_gainers_losers,
+    MarketSnapshot,
     get_global_change_24h,
-    get_markets,
-    _get,  # 
+    get_global,
+    get_markets_pages,
+    iter_markets_pages,
+    estimate_scan_seconds,
 )
-from mcp_client_stdio import fetch_mcp_summary  # async
+from mcp_client_stdio import fetch_mcp_markets, summarize_markets  # async fetch
+from stream_analyzer import StreamingAnalyzer
+from market_table import MarketTable
+from snapshot_store import get_store
+from anomaly import AnomalyEngine
+from metrics import metrics, inc
+from config import REPORT_DEADLINE_S, SCAN_PAGES, SCAN_STREAM, SNAPSHOT_DB
 
 # ----------------- utils formating -----------------
 
@@ -31,36 +43,14 @@ def _tok(t: Dict[str, Any]) -> Dict[str, Any]:
         out["fomo_100_final"] = t["fomo_100_final"]
     return out
 
-def _safe(x: Dict[str, Any], k: str, d: float = 0.0) -> float:
-    try:
-        return float(x.get(k, d) or d)
-    except Exception:
-        return d
-
 # -----------------  REST -----------------
 
-def get_majors_snapshot(ids: List[str] = ["bitcoin", "ethereum", "solana"]) -> Dict[str, Dict[str, Any]]:
-    rows = get_markets(per_page=250, vs_currency="usd", page=1)
-    by_id = {r.get("id"): r for r in rows}
-    out: Dict[str, Dict[str, Any]] = {}
-    for cid in ids:
-        r = by_id.get(cid)
-        if not r:
-            continue
-        out[cid] = {
-            "name": r.get("name"),
-            "symbol": (r.get("symbol") or "").upper(),
-            "price": _safe(r, "current_price"),
-            "pct_24h": _safe(r, "price_change_percentage_24h"),
-            "high_24h": _safe(r, "high_24h"),
-            "low_24h": _safe(r, "low_24h"),
-            "volume_24h": _safe(r, "total_volume"),
-            "market_cap": _safe(r, "market_cap"),
-        }
-    return out
+def get_majors_snapshot(ids: List[str] = ["bitcoin", "ethereum", "solana"],
+                        snapshot: Optional[MarketSnapshot] = None) -> Dict[str, Dict[str, Any]]:
+    return (snapshot or MarketSnapshot()).table.majors(ids)
 
-def get_global_snapshot() -> Dict[str, Any]:
-    data = _get("/global")
+def get_global_snapshot(snapshot: Optional[MarketSnapshot] = None) -> Dict[str, Any]:
+    data = (snapshot or MarketSnapshot()).global_data
     d = data.get("data", {}) if isinstance(data, dict) else {}
     mcap = d.get("total_market_cap") or {}
     vol  = d.get("total_volume") or {}
@@ -73,9 +63,195 @@ def get_global_snapshot() -> Dict[str, Any]:
         "markets": d.get("markets"),
     }
 
-# ----------------- unique request MCP -----------------
+# ----------------- concurrent collection -----------------
+
+# If MCP has not answered by this share of the deadline, REST markets are started in parallel
+MCP_HEDGE_FRACTION = 0.5
+# Stream mode waits for /global before scanning, at most this share of the deadline
+GLOBAL_FIRST_FRACTION = 0.25
+# After the deadline, how long stream mode waits for its page consumer to stop
+STREAM_JOIN_S = 2.0
+
+# Own pool for blocking REST calls: asyncio.run() does not wait on it at shutdown,
+# so a request still in flight after the deadline cannot hold the report back
+_IO_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="report-io")
+
+def _in_thread(fn, *args, **kwargs):
+    # carry the context over so spans opened in the worker keep their parent
+    ctx = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(_IO_POOL, partial(ctx.run, fn, *args, **kwargs))
+
+async def _tagged(source: str, fut) -> Tuple[List[Dict[str, Any]], str]:
+    return await fut, source
+
+async def _markets_task(per_page: int, pages: int, hedge_after: float) -> Tuple[List[Dict[str, Any]], str]:
+    """MCP markets with a hedged REST fallback; first non-empty answer wins."""
+    mcp_task = asyncio.ensure_future(_tagged("mcp", fetch_mcp_markets(per_page=per_page, pages=pages)))
+    done, _ = await asyncio.wait({mcp_task}, timeout=hedge_after)
+    if mcp_task in done:
+        if mcp_task.exception() is None and mcp_task.result()[0]:
+            return mcp_task.result()
+        print("MCP markets failed or empty, falling back to REST:", mcp_task.exception())
+        inc("fallbacks_total", path="mcp_to_rest", reason="error" if mcp_task.exception() else "empty")
+    else:
+        inc("hedged_requests_total", path="mcp_to_rest")
+
+    rest_task = asyncio.ensure_future(_tagged("rest", _in_thread(get_markets_pages, pages=pages, per_page=per_page)))
+    pending = {t for t in (mcp_task, rest_task) if not t.done()}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for t in done:
+            if t.exception() is None and t.result()[0]:
+                for p in pending:
+                    p.cancel()
+                return t.result()
+    return rest_task.result()  # re-raises the REST error if both failed
+
+async def collect_snapshot(per_page: int = 250, deadline: float = REPORT_DEADLINE_S,
+                           pages: int = 1) -> MarketSnapshot:
+    """
+    Fetch every source concurrently under one deadline. Sources that miss it
+    are left empty, so the report is built from whatever has arrived.
+    """
+    if pages > 1:
+        print(f"Scanning {pages} market pages (rate limit alone: >= {estimate_scan_seconds(pages):.0f}s)")
+    elif pages <= 0:
+        print("Scanning the whole coin list")
+    tasks = {
+        "markets": asyncio.ensure_future(_markets_task(per_page, pages, deadline * MCP_HEDGE_FRACTION)),
+        "global": asyncio.ensure_future(_in_thread(get_global)),
+    }
+    done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for t in pending:
+        t.cancel()
+
+    got: Dict[str, Any] = {}
+    for name, t in tasks.items():
+        if t not in done:
+            print(f"{name} missed the {deadline:.0f}s report deadline")
+            inc("deadline_misses_total", source=name)
+        elif t.exception() is not None:
+            print(f"{name} failed:", t.exception())
+            inc("source_failures_total", source=name)
+        else:
+            got[name] = t.result()
 
-def _fetch_mcp_summary_auto(top_n: int = 5, per_page: int = 250) -> Dict[str, Any]:
+    markets, source = got.get("markets") or ([], None)
+    inc("markets_source_total", source=source or "none")
+    # empty (not None) values keep the snapshot from refetching after the deadline
+    return MarketSnapshot(
+        per_page=per_page,
+        markets=markets,
+        global_data=got.get("global") or {},
+        source=source,
+        pages=pages,
+    )
+
+async def collect_streaming(top_n: int = 5, per_page: int = 250, deadline: float = REPORT_DEADLINE_S,
+                            pages: int = 1) -> Tuple[Dict[str, Any], MarketSnapshot]:
+    """
+    Streaming variant: market pages are folded into a StreamingAnalyzer as they
+    arrive instead of being kept. At the deadline whatever pages were consumed
+    are already analysed, so no sorting pass is left to do.
+    """
+    ts = int(time.time())
+    started = time.monotonic()
+    # /global first: the market's 24h move has to be known before the first page is scored,
+    # so stream mode scores and feeds the shared baselines exactly like snapshot mode
+    global_data: Dict[str, Any] = {}
+    try:
+        global_data = await asyncio.wait_for(_in_thread(get_global), timeout=deadline * GLOBAL_FIRST_FRACTION)
+    except asyncio.TimeoutError:
+        print(f"global missed its {deadline * GLOBAL_FIRST_FRACTION:.0f}s share of the report deadline")
+        inc("deadline_misses_total", source="global")
+    except Exception as e:
+        print("global failed:", e)
+        inc("source_failures_total", source="global")
+    global_change = get_global_change_24h(MarketSnapshot(markets=[], global_data=global_data)) if global_data else None
+    if global_change is None:
+        # without the market move, raw 24h moves would skew the market-relative baselines
+        print("No market 24h change, stream mode uses the fixed strange rule and leaves baselines alone")
+    agg = StreamingAnalyzer(top_n=top_n, anomaly=_anomaly_engine() if global_change is not None else None,
+                            ts=ts, global_change=global_change)
+    stop = threading.Event()
+
+    def _consume() -> None:
+        pages_iter = iter_markets_pages(pages=pages, per_page=per_page, stop=stop)
+        try:
+            for rows in pages_iter:
+                if stop.is_set():  # past the deadline: the report is being built, feed nothing more
+                    break
+                table = MarketTable.from_rows(rows)
+                agg.feed(table)
+                if agg.pages == 1:
+                    _remember(table)  # the top page only: stream mode keeps no rows
+                _record_snapshot(table, ts=ts, source="rest")  # page by page, rows are not kept
+        finally:
+            pages_iter.close()
+
+    markets = asyncio.ensure_future(_in_thread(_consume))
+    left = max(0.0, deadline - (time.monotonic() - started))
+    done, _ = await asyncio.wait({markets}, timeout=left)
+    stop.set()
+    if markets not in done:
+        print(f"markets missed the {deadline:.0f}s report deadline")
+        inc("deadline_misses_total", source="markets")
+        # join the consumer: it exits within STOP_POLL_S, or after the page it is feeding,
+        # so no page reaches the heaps, baselines or store once the result is read
+        await asyncio.wait({markets}, timeout=STREAM_JOIN_S)
+        if not markets.done():
+            print("markets consumer still busy after the deadline")
+    elif markets.exception() is not None:
+        print("markets failed:", markets.exception())
+        inc("source_failures_total", source="markets")
+
+    if global_data:
+        _record_snapshot(MarketTable.from_rows([]), global_data=global_data, ts=ts)
+    summary = agg.result()
+    snapshot = MarketSnapshot(per_page=per_page, markets=[], global_data=global_data or {},
+                              source="rest" if summary["markets_count"] else None, pages=pages)
+    return summary, snapshot
+
+def _record_snapshot(table: MarketTable, global_data: Optional[Dict[str, Any]] = None,
+                     ts: Optional[int] = None, source: Optional[str] = None) -> None:
+    """Append to the local history (SNAPSHOT_DB); never fails the report."""
+    if not SNAPSHOT_DB:
+        return
+    try:
+        get_store(SNAPSHOT_DB).append(table, global_data=global_data, ts=ts, source=source)
+    except Exception as e:
+        print("Snapshot store write failed:", e)
+
+_anomaly: Optional[AnomalyEngine] = None
+
+def _anomaly_engine() -> AnomalyEngine:
+    """Process-wide engine; baselines persist in SNAPSHOT_DB when it is enabled."""
+    global _anomaly
+    if _anomaly is None:
+        store = None
+        if SNAPSHOT_DB:
+            try:
+                store = get_store(SNAPSHOT_DB)
+            except Exception as e:
+                print("Snapshot store unavailable, anomaly baselines kept in memory:", e)
+        _anomaly = AnomalyEngine(store=store)
+    return _anomaly
+
+# the last report's market table, reused by interactive lookups (/ask) instead of refetching
+_latest: Optional[Tuple[float, MarketTable]] = None
+
+def latest_table(max_age: float) -> Optional[MarketTable]:
+    """Market table of the last report if it is younger than `max_age` seconds."""
+    latest = _latest
+    if latest is None or time.time() - latest[0] > max_age:
+        return None
+    return latest[1]
+
+def _remember(table: MarketTable) -> None:
+    global _latest
+    _latest = (time.time(), table)
+
+def _run_auto(make_coro, timeout: float, default: Any) -> Any:
     
     try:
         loop = asyncio.get_running_loop()
@@ -85,50 +261,65 @@ def _fetch_mcp_summary_auto(top_n: int = 5, per_page: int = 250) -> Dict[str, An
 
     if not loop_running:
         # обычный синхронный контекст
-        try:
-            return asyncio.run(fetch_mcp_summary(top_n=top_n, per_page=per_page))
-        except Exception as e:
-            print("MCP summary failed (sync run):", e)
-            return {}
+        return asyncio.run(make_coro())
 
     # если уже есть активный loop (aiogram/FastAPI/и т.п.) — уходим в отдельный поток
     holder: Dict[str, Any] = {}
 
     def _runner():
         try:
-            holder["res"] = asyncio.run(fetch_mcp_summary(top_n=top_n, per_page=per_page))
+            holder["res"] = asyncio.run(make_coro())
         except Exception as e:
-            print("MCP summary failed (thread run):", e)
-            holder["res"] = {}
+            print("Report collection failed (thread run):", e)
 
     t = threading.Thread(target=_runner, daemon=True)
     t.start()
-    t.join(timeout=45)  
-    return holder.get("res", {})
+    t.join(timeout=timeout)
+    return holder.get("res") or default
 
 # ----------------- main report collect -----------------
 
-def prepare_report(top_n: int = 5) -> Dict[str, Any]:
-    # REST baseline
-    gain_raw, lose_raw = get_top_gainers_losers(top_n=top_n)
-    gain_rest = [_tok(x) for x in gain_raw]
-    lose_rest = [_tok(x) for x in lose_raw]
-    global_pct = get_global_change_24h()
-    majors = get_majors_snapshot()
-    global_full = get_global_snapshot()
-
-    # MCP enrichment 
-    mcp = _fetch_mcp_summary_auto(top_n=top_n, per_page=250) or {}
+@metrics.timed("prepare_report")
+def prepare_report(top_n: int = 5, deadline: float = REPORT_DEADLINE_S,
+                   pages: int = SCAN_PAGES, stream: bool = SCAN_STREAM) -> Dict[str, Any]:
+    # MCP markets and REST /global are collected concurrently under one deadline;
+    # `pages` > 1 (or 0 = whole list) widens the scan beyond the top 250 by cap
+    empty = MarketSnapshot(per_page=250, markets=[], global_data={})
+    if stream:
+        # REST pages folded into bounded heaps as they arrive; rows are not kept
+        summary, snapshot = _run_auto(
+            lambda: collect_streaming(top_n=top_n, per_page=250, deadline=deadline, pages=pages),
+            timeout=deadline + 5,
+            default=(StreamingAnalyzer(top_n=top_n).result(), empty),
+        )
+        majors = summary["majors"]
+    else:
+        snapshot = _run_auto(
+            lambda: collect_snapshot(per_page=250, deadline=deadline, pages=pages),
+            timeout=deadline + 5,
+            default=empty,
+        )
+        # one columnar table per run (MCP rows, or REST rows if MCP fell through)
+        global_pct = get_global_change_24h(snapshot=snapshot)
+        majors = get_majors_snapshot(snapshot=snapshot)
+        engine = _anomaly_engine()
+        summary = summarize_markets(snapshot.table, top_n=top_n, global_change=global_pct, anomaly=engine)
+        if len(snapshot.table) and global_pct is not None:  # baselines hold market-relative moves only
+            engine.update(snapshot.table, global_change=global_pct)
+        if len(snapshot.table):
+            _remember(snapshot.table)
+        if len(snapshot.table) or snapshot.global_data:
+            _record_snapshot(snapshot.table, global_data=snapshot.global_data, source=snapshot.source)
 
-    # Use REST if MCP returm empty
-    gainers = [ _tok(x) for x in mcp.get("gainers", []) ] or gain_rest
-    losers  = [ _tok(x) for x in mcp.get("losers",  []) ] or lose_rest
-    strange = [ _tok(x) for x in mcp.get("strange", []) ]
+    global_pct = get_global_change_24h(snapshot=snapshot)
+    global_full = get_global_snapshot(snapshot=snapshot)
+    mcp = summary if snapshot.source == "mcp" else {}
 
-    # FOMO: MCP →  >=20%
-    fomo = [ _tok(x) for x in mcp.get("fomo", []) ]
-    if not fomo:
-        fomo = [t for t in gainers if t["pct"] >= 20][:3]
+    gainers = [ _tok(x) for x in summary["gainers"] ]
+    losers  = [ _tok(x) for x in summary["losers"] ]
+    strange = [ _tok(x) for x in summary["strange"] ]
+    # FOMO: gainers >= 20%
+    fomo    = [ _tok(x) for x in summary["fomo"] ]
 
     return {
         "global_change_24h": global_pct,
@@ -140,8 +331,11 @@ def prepare_report(top_n: int = 5) -> Dict[str, Any]:
         "fomo":    fomo,
         "mcp":     mcp,
         "sources": {
-            "rest": True,
+            "rest": snapshot.source == "rest" or bool(snapshot.global_data),
             "mcp":  bool(mcp),
             "mcp_markets_count": mcp.get("markets_count"),
+            "markets_count": summary["markets_count"],
+            "pages": pages,
+            "stream": stream,
         }
     }
@@ -0,0 +1,121 @@
+# anomaly.py
+from __future__ import annotations
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from market_table import MarketTable
+from snapshot_store import Baseline, SnapshotStore
+
+ANOMALY_ALPHA = float(os.getenv("ANOMALY_ALPHA", "0.1"))          # EWMA weight of the newest snapshot
+ANOMALY_Z = float(os.getenv("ANOMALY_Z", "3.0"))                  # |z| that counts as strange
+ANOMALY_WARMUP = int(os.getenv("ANOMALY_WARMUP", "5"))            # snapshots before a coin is scored
+ANOMALY_MIN_UPDATE_S = int(os.getenv("ANOMALY_MIN_UPDATE_S", "3600"))  # don't let bursts of /report skew baselines
+
+# variance floors keep near-constant coins (stables) from producing huge z-scores
+_MOVE_VAR_FLOOR = 1.0    # (1 %)^2
+_LVOL_VAR_FLOOR = 0.01
+
+class AnomalyEngine:
+    """
+    Scores each coin's 24h move and volume against its own rolling baseline.
+
+    Baselines are EWMA mean/variance of the move (pct, market-relative when the
+    market is not flat) and of log volume. Each snapshot updates them in O(1)
+    per coin, so the per-run cost does not depend on how much history exists.
+    Coins still warming up fall back to the fixed |move| >= 20% rule.
+    """
+
+    def __init__(self, store: Optional[SnapshotStore] = None, alpha: float = ANOMALY_ALPHA,
+                 z_threshold: float = ANOMALY_Z, warmup: int = ANOMALY_WARMUP,
+                 min_update_s: int = ANOMALY_MIN_UPDATE_S):
+        self.store = store
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.min_update_s = min_update_s
+        self._baselines: Optional[Dict[str, Baseline]] = None
+
+    @property
+    def baselines(self) -> Dict[str, Baseline]:
+        if self._baselines is None:
+            self._baselines = self.store.load_baselines() if self.store else {}
+        return self._baselines
+
+    def _aligned(self, table: MarketTable) -> np.ndarray:
+        """Baselines for the table's rows as an (n, 6) array; unknown coins are all zeros."""
+        empty = (0, 0, 0.0, 0.0, 0.0, 0.0)
+        b = self.baselines
+        return np.array([b.get(cid, empty) for cid in table.ids.tolist()], dtype=np.float64).reshape(len(table), 6)
+
+    # ----------------- scoring -----------------
+
+    def score(self, table: MarketTable, global_change: Optional[float] = None,
+              global_change_abs_lt: float = 1.0) -> Dict[str, np.ndarray]:
+        move = table.move(global_change, global_change_abs_lt)
+        lvol = np.log1p(np.maximum(table.volume, 0.0))
+        base = self._aligned(table)
+        n, m_mean, m_var, v_mean, v_var = base[:, 0], base[:, 2], base[:, 3], base[:, 4], base[:, 5]
+        z_move = (move - m_mean) / np.sqrt(np.maximum(m_var, _MOVE_VAR_FLOOR))
+        z_vol = (lvol - v_mean) / np.sqrt(np.maximum(v_var, _LVOL_VAR_FLOOR))
+        z_vol = np.where(table.volume > 0, z_vol, 0.0)
+        warm = n >= self.warmup
+        score = np.where(warm, np.maximum(np.abs(z_move), z_vol), 0.0)
+        flagged = np.where(warm, score >= self.z_threshold, np.abs(move) >= 20.0)
+        return {"move": move, "z_move": z_move, "z_vol": z_vol, "score": score,
+                "warm": warm, "flagged": flagged & table.priced()}
+
+    def strange_idx(self, table: MarketTable, top_n: int = 5, global_change: Optional[float] = None,
+                    global_change_abs_lt: float = 1.0) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Flagged rows ranked by score (cold coins rank by |move| / 20, so they sort below warm ones)."""
+        s = self.score(table, global_change, global_change_abs_lt)
+        s["rank"] = np.where(s["warm"], s["score"], np.abs(s["move"]) / 20.0)
+        return table.top_idx(top_n, s["rank"], largest=True, mask=s["flagged"]), s
+
+    def strange(self, table: MarketTable, top_n: int = 5, global_change: Optional[float] = None,
+                global_change_abs_lt: float = 1.0) -> List[Dict[str, Any]]:
+        idx, s = self.strange_idx(table, top_n, global_change, global_change_abs_lt)
+        return self.records(table, idx, s)
+
+    @staticmethod
+    def records(table: MarketTable, idx: np.ndarray, s: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        out = table.records(idx)
+        for row, zm, zv in zip(out, s["z_move"][idx].tolist(), s["z_vol"][idx].tolist()):
+            row["z_move"] = round(zm, 2)
+            row["z_vol"] = round(zv, 2)
+        return out
+
+    # ----------------- incremental baseline update -----------------
+
+    def update(self, table: MarketTable, ts: Optional[int] = None, global_change: Optional[float] = None,
+               global_change_abs_lt: float = 1.0) -> int:
+        """Fold one snapshot into the baselines; returns how many coins were updated."""
+        ts = int(ts if ts is not None else time.time())
+        base = self._aligned(table)
+        n, last_ts = base[:, 0], base[:, 1]
+        keep = (table.ids != None) & ((n == 0) | (ts - last_ts >= self.min_update_s))  # noqa: E711
+        if not keep.any():
+            return 0
+
+        a = self.alpha
+        move = table.move(global_change, global_change_abs_lt)
+        lvol = np.log1p(np.maximum(table.volume, 0.0))
+        first = n == 0
+        # EWMA mean/variance: d = x - mean; mean += a*d; var = (1-a)*(var + a*d^2)
+        d_m = move - base[:, 2]
+        d_v = lvol - base[:, 4]
+        m_mean = np.where(first, move, base[:, 2] + a * d_m)
+        m_var = np.where(first, 0.0, (1 - a) * (base[:, 3] + a * d_m * d_m))
+        v_mean = np.where(first, lvol, base[:, 4] + a * d_v)
+        v_var = np.where(first, 0.0, (1 - a) * (base[:, 5] + a * d_v * d_v))
+
+        rows: Dict[str, Baseline] = {}
+        sel = np.flatnonzero(keep)
+        for cid, cnt, mm, mv, vm, vv in zip(table.ids[sel].tolist(), (n[sel] + 1).tolist(),
+                                            m_mean[sel].tolist(), m_var[sel].tolist(),
+                                            v_mean[sel].tolist(), v_var[sel].tolist()):
+            rows[cid] = (int(cnt), ts, mm, mv, vm, vv)
+        self.baselines.update(rows)
+        if self.store:
+            self.store.save_baselines(rows)
+        return len(rows)
@@ -0,0 +1,97 @@
+# bench/fake_mcp_server.py
+"""
+Minimal MCP stdio server exposing `get_coins_markets`, for offline runs:
+
+    MCP_SERVER_COMMAND="python bench/fake_mcp_server.py" python main.py
+
+Speaks newline-delimited JSON-RPC 2.0 (the MCP stdio transport). Market pages
+are proxied from COINGECKO_BASE_URL, so it serves whatever the HTTP fakes serve
+(same latency and error injection).
+"""
+from __future__ import annotations
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+BASE = os.getenv("COINGECKO_BASE_URL", "http://127.0.0.1:8765/api/v3").rstrip("/")
+
+TOOL = {
+    "name": "get_coins_markets",
+    "description": "Coins with price, market cap and volume (CoinGecko /coins/markets).",
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "vs_currency": {"type": "string"},
+            "per_page": {"type": "integer"},
+            "page": {"type": "integer"},
+        },
+    },
+}
+
+_out_lock = threading.Lock()
+
+def _write(msg: Dict[str, Any]) -> None:
+    with _out_lock:
+        sys.stdout.write(json.dumps(msg) + "\n")
+        sys.stdout.flush()
+
+def _call_markets(args: Dict[str, Any]) -> Dict[str, Any]:
+    query = urlencode({k: v for k, v in args.items() if v is not None})
+    try:
+        with urlopen(f"{BASE}/coins/markets?{query}", timeout=30) as r:
+            text = r.read().decode()
+        return {"content": [{"type": "text", "text": text}], "isError": False}
+    except HTTPError as e:
+        return {"content": [{"type": "text", "text": f"upstream {e.code}"}], "isError": True}
+
+def _handle(req: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    method, params = req.get("method"), req.get("params") or {}
+    if method == "initialize":
+        return {
+            "protocolVersion": params.get("protocolVersion", "2025-06-18"),
+            "capabilities": {"tools": {"listChanged": False}},
+            "serverInfo": {"name": "fake-coingecko-mcp", "version": "0.1"},
+        }
+    if method == "ping":
+        return {}
+    if method == "tools/list":
+        return {"tools": [TOOL]}
+    if method == "tools/call":
+        if params.get("name") != TOOL["name"]:
+            raise ValueError(f"unknown tool {params.get('name')}")
+        return _call_markets(params.get("arguments") or {})
+    raise KeyError(method)
+
+def _serve(req: Dict[str, Any]) -> None:
+    try:
+        result = _handle(req)
+        _write({"jsonrpc": "2.0", "id": req["id"], "result": result})
+    except KeyError as e:
+        _write({"jsonrpc": "2.0", "id": req["id"], "error": {"code": -32601, "message": f"method not found: {e}"}})
+    except Exception as e:
+        _write({"jsonrpc": "2.0", "id": req["id"], "error": {"code": -32603, "message": str(e)}})
+
+def main() -> None:
+    # requests are answered concurrently, like a real server multiplexing one session
+    pool = ThreadPoolExecutor(max_workers=8)
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            req = json.loads(line)
+        except ValueError:
+            continue
+        if "id" not in req or "method" not in req:
+            continue  # notifications and responses need no answer
+        pool.submit(_serve, req)
+    pool.shutdown(wait=True)
+
+if __name__ == "__main__":
+    main()
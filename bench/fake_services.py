@@ -0,0 +1,256 @@
+# bench/fake_services.py
+"""
+Local stand-ins for CoinGecko, Claude (Anthropic Messages API) and Telegram on one HTTP port.
+
+Payloads are synthetic (seeded) or replayed from a directory of recordings:
+    markets.json   list of /coins/markets rows in market-cap order (paged by the server)
+    global.json    /global response
+    comments.json  the JSON object Claude should answer with
+Every response waits `latency_ms` (+/- `jitter`), and `error_rate` of requests
+fail the way the real service does under load (429 / 529).
+"""
+from __future__ import annotations
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+MAJOR_IDS = ["bitcoin", "ethereum", "solana"]
+
+def synthetic_markets(n: int, seed: int = 7) -> List[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        cid = MAJOR_IDS[i] if i < len(MAJOR_IDS) else f"coin-{i}"
+        price = rnd.lognormvariate(0, 3)
+        pct = rnd.gauss(0, 6) if rnd.random() > 0.02 else rnd.uniform(-60, 120)
+        rows.append({
+            "id": cid,
+            "symbol": cid[:3] if i < len(MAJOR_IDS) else f"c{i}",
+            "name": cid.title(),
+            "current_price": price,
+            "market_cap": 1e12 / (i + 1),
+            "total_volume": 1e11 / (i + 1) * rnd.uniform(0.2, 5),
+            "high_24h": price * 1.05,
+            "low_24h": price * 0.95,
+            "price_change_percentage_24h": pct,
+        })
+    return rows
+
+SYNTHETIC_GLOBAL = {"data": {
+    "total_market_cap": {"usd": 2.4e12},
+    "total_volume": {"usd": 9.1e10},
+    "market_cap_change_percentage_24h_usd": -0.8,
+    "market_cap_percentage": {"btc": 54.2},
+}}
+
+SYNTHETIC_COMMENTS = {
+    "fomo": "Bench run: majors flat, small caps doing the heavy lifting.",
+    "market_comment": "Breadth is thin; most of the move sits in a handful of names.",
+    "majors_comment": "BTC range-bound, ETH and SOL follow.",
+    "gainers_notes": {},
+    "losers_notes": {},
+}
+
+class FakeState:
+    """Everything the handlers serve plus request counters; mutable between runs."""
+
+    def __init__(self, markets: List[Dict[str, Any]], global_data: Dict[str, Any],
+                 comments: Dict[str, Any], latency_ms: float = 0.0, jitter: float = 0.2,
+                 error_rate: float = 0.0, seed: int = 7):
+        self.markets = markets
+        self.global_data = global_data
+        self.comments = comments
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self.message_id = 0
+
+    def hit(self, name: str) -> None:
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def delay(self) -> None:
+        if self.latency_ms > 0:
+            with self.lock:
+                f = 1 + self.rnd.uniform(-self.jitter, self.jitter)
+            time.sleep(self.latency_ms * f / 1000)
+
+    def should_fail(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self.lock:
+            return self.rnd.random() < self.error_rate
+
+    def next_message_id(self) -> int:
+        with self.lock:
+            self.message_id += 1
+            return self.message_id
+
+def load_state(payload_dir: Optional[str] = None, size: int = 2000, **kw: Any) -> FakeState:
+    def _load(name: str, default: Any) -> Any:
+        path = os.path.join(payload_dir, name) if payload_dir else ""
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return default
+
+    markets = _load("markets.json", None)
+    if markets is None:
+        markets = synthetic_markets(size)
+    return FakeState(markets[:size], _load("global.json", SYNTHETIC_GLOBAL),
+                     _load("comments.json", SYNTHETIC_COMMENTS), **kw)
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+    state: FakeState
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _json(self, code: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> Dict[str, Any]:
+        n = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(n) or b"{}") if n else {}
+
+    # --- CoinGecko ---
+    def do_GET(self) -> None:
+        st = self.state
+        url = urlparse(self.path)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        st.delay()
+        if url.path.endswith("/coins/markets"):
+            st.hit("coingecko")
+            if st.should_fail():
+                return self._json(429, {"status": {"error_code": 429}}, {"Retry-After": "0"})
+            if q.get("ids"):
+                ids = set(q["ids"].split(","))
+                return self._json(200, [m for m in st.markets if m.get("id") in ids])
+            per_page, page = int(q.get("per_page", 100)), int(q.get("page", 1))
+            return self._json(200, st.markets[(page - 1) * per_page: page * per_page])
+        if url.path.endswith("/coins/list"):
+            st.hit("coingecko")
+            return self._json(200, [{"id": m.get("id"), "symbol": m.get("symbol"), "name": m.get("name")}
+                                    for m in st.markets])
+        if url.path.endswith("/simple/price"):
+            st.hit("coingecko")
+            ids = set((q.get("ids") or "").split(","))
+            return self._json(200, {m["id"]: {"usd": m["current_price"], "usd_24h_change": m["price_change_percentage_24h"]}
+                                    for m in st.markets if m.get("id") in ids})
+        if url.path.endswith("/exchange_rates"):
+            st.hit("coingecko")
+            btc = next((m["current_price"] for m in st.markets if m.get("id") == "bitcoin"), 67000.0)
+            return self._json(200, {"rates": {
+                "btc": {"name": "Bitcoin", "unit": "BTC", "value": 1.0, "type": "crypto"},
+                "usd": {"name": "US Dollar", "unit": "$", "value": btc, "type": "fiat"},
+                "eur": {"name": "Euro", "unit": "€", "value": btc * 0.92, "type": "fiat"},
+                "gbp": {"name": "British Pound Sterling", "unit": "£", "value": btc * 0.78, "type": "fiat"},
+            }})
+        if url.path.endswith("/global"):
+            st.hit("coingecko")
+            if st.should_fail():
+                return self._json(429, {"status": {"error_code": 429}}, {"Retry-After": "0"})
+            return self._json(200, st.global_data)
+        self._json(404, {"error": f"not faked: {url.path}"})
+
+    # --- Anthropic + Telegram ---
+    def do_POST(self) -> None:
+        st = self.state
+        path = urlparse(self.path).path
+        body = self._body()
+        st.delay()
+        if path.endswith("/v1/messages/count_tokens"):
+            text = json.dumps(body.get("messages")) + str(body.get("system") or "")
+            return self._json(200, {"input_tokens": len(text) // 4})
+        if path.endswith("/v1/messages"):
+            st.hit("claude")
+            if st.should_fail():
+                return self._json(529, {"type": "error", "error": {"type": "overloaded_error", "message": "bench"}})
+            return self._json(200, {
+                "id": f"msg_bench_{st.next_message_id()}",
+                "type": "message",
+                "role": "assistant",
+                "model": body.get("model", "bench"),
+                "content": [{"type": "text", "text": json.dumps(st.comments)}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": 300, "output_tokens": 200},
+            })
+        if "/bot" in path:
+            method = path.rsplit("/", 1)[-1]
+            st.hit("telegram")
+            if st.should_fail():
+                return self._json(429, {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                                        "parameters": {"retry_after": 0}})
+            if method == "sendMessage":
+                return self._json(200, {"ok": True, "result": {"message_id": st.next_message_id()}})
+            return self._json(200, {"ok": True, "result": True})
+        self._json(404, {"error": f"not faked: {path}"})
+
+class FakeServices:
+    """Runs the fakes on 127.0.0.1 in a background thread; `base_url` is http://127.0.0.1:<port>."""
+
+    def __init__(self, state: FakeState, port: int = 0):
+        handler = type("Handler", (_Handler,), {"state": state})
+        self.state = state
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-services", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment that points every client at the fakes (set before importing the bot modules)."""
+        return {
+            "COINGECKO_BASE_URL": f"{self.base_url}/api/v3",
+            "CLAUDE_BASE_URL": self.base_url,
+            "TELEGRAM_API_BASE": self.base_url,
+            "COINGECKO_API_KEY": "bench",
+            "CLAUDE_API_KEY": "bench",
+            "TELEGRAM_BOT_TOKEN": "bench",
+            "TELEGRAM_CHAT_ID": "1",
+        }
+
+    def __enter__(self) -> "FakeServices":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Serve the fakes until Ctrl-C.")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--size", type=int, default=2000)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--payloads", help="directory with markets.json / global.json / comments.json")
+    a = ap.parse_args()
+    st = load_state(a.payloads, a.size, latency_ms=a.latency_ms, error_rate=a.error_rate)
+    with FakeServices(st, a.port) as fs:
+        for k, v in fs.env().items():
+            print(f"{k}={v}")
+        try:
+            fs.thread.join()
+        except KeyboardInterrupt:
+            pass
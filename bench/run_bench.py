@@ -0,0 +1,195 @@
+# bench/run_bench.py
+"""
+Offline end-to-end benchmark: the real pipeline against local fakes (bench/fake_services.py,
+bench/fake_mcp_server.py). No API keys or network needed.
+
+    python bench/run_bench.py --sizes 250,2000,10000 --latency-ms 40 --repeat 5
+    python bench/run_bench.py --no-mcp --error-rate 0.05 --json bench.json
+
+Per market size it reports latency (median / max) for each stage:
+    collect   build_payload -> prepare_report (MCP / REST fetch + analysis)
+    comments  one Claude call (comment cache cleared first)
+    render    report model + Telegram chunks
+    deliver   post to the channel + broadcast to --subscribers chats
+    e2e       generate_daily_report + post, everything cold except sessions
+plus throughput (rows/s, messages/s) and tracemalloc peak memory per stage.
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+from fake_services import FakeServices, load_state, synthetic_markets  # noqa: E402
+
+STAGES = ["collect", "comments", "render", "deliver", "e2e"]
+
+def _configure(fs: FakeServices, args: argparse.Namespace, workdir: str) -> None:
+    """Point the bot at the fakes; must run before the bot modules are imported."""
+    env = fs.env()
+    env.update({
+        "SCAN_PAGES": "all",
+        "SNAPSHOT_DB": os.path.join(workdir, "snapshots.db"),
+        "SUBSCRIBERS_DB": os.path.join(workdir, "subscribers.db"),
+        "COINGECKO_RATE_LIMIT_PER_MIN": "600000",
+        "COINGECKO_RATE_LIMIT_BURST": "1000",
+        "PROGRESSIVE_DELIVERY": "0",
+        "SLACK_WEBHOOK_URL": "",
+        "DISCORD_WEBHOOK_URL": "",
+    })
+    if not args.real_pacing:
+        env.update({"TELEGRAM_GLOBAL_RATE": "100000", "TELEGRAM_PER_CHAT_INTERVAL_S": "0"})
+    if args.no_mcp:
+        env["MCP_SERVER_COMMAND"] = f'"{sys.executable}" -c "pass"'  # exits at once -> REST fallback
+    else:
+        env["MCP_SERVER_COMMAND"] = f'"{sys.executable}" "{os.path.join(HERE, "fake_mcp_server.py")}"'
+    os.environ.update(env)
+
+def _timed(fn: Callable[[], Any], quiet: bool) -> Tuple[Any, float]:
+    out = io.StringIO() if quiet else sys.stdout
+    with contextlib.redirect_stdout(out):
+        t0 = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - t0
+
+def _peak(fn: Callable[[], Any], quiet: bool) -> Tuple[Any, int]:
+    tracemalloc.start()
+    try:
+        result, _ = _timed(fn, quiet)
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    state = load_state(args.payloads, max(args.sizes), latency_ms=args.latency_ms,
+                       jitter=args.jitter, error_rate=args.error_rate)
+    universe = state.markets if args.payloads else synthetic_markets(max(args.sizes))
+    workdir = tempfile.mkdtemp(prefix="fomo-bench-")
+
+    with FakeServices(state) as fs:
+        _configure(fs, args, workdir)
+        import coingecko_client as cg
+        import claude_writer as cw
+        from report_model import build_report
+        from renderers import render_telegram
+        from telegram_poster import send_telegram_chunks
+        from broadcast import broadcast
+
+        chat_ids = list(range(1000, 1000 + args.subscribers))
+
+        def cold() -> None:
+            cg._cache.clear()
+            cw._comment_cache.clear()
+
+        def stages() -> Dict[str, Callable[[], Any]]:
+            ctx: Dict[str, Any] = {}
+
+            def collect():
+                ctx["payload"] = cw.build_payload(top_n=5)
+
+            def comments():
+                ctx["comments"] = cw._get_comments(ctx["payload"])
+
+            def render():
+                ctx["chunks"] = render_telegram(build_report(ctx["payload"], ctx["comments"]))
+
+            def deliver():
+                send_telegram_chunks(ctx["chunks"])
+                if chat_ids:
+                    broadcast(ctx["chunks"], chat_ids=chat_ids)
+                return len(ctx["chunks"]) * (1 + len(chat_ids))
+
+            def e2e():
+                cold()
+                send_telegram_chunks(render_telegram(cw.generate_report()))
+
+            return {"collect": collect, "comments": comments, "render": render, "deliver": deliver, "e2e": e2e}
+
+        results: Dict[str, Any] = {"config": vars(args), "sizes": {}}
+        for size in args.sizes:
+            state.markets = universe[:size]
+            times: Dict[str, List[float]] = {s: [] for s in STAGES}
+            sent = 0
+            for i in range(args.warmup + args.repeat):
+                cold()
+                for name, fn in stages().items():
+                    value, dt_s = _timed(fn, not args.verbose)
+                    if i >= args.warmup:
+                        times[name].append(dt_s)
+                        if name == "deliver":
+                            sent = value
+
+            peaks: Dict[str, int] = {}
+            cold()
+            for name, fn in stages().items():
+                _, peaks[name] = _peak(fn, not args.verbose)
+
+            row: Dict[str, Any] = {}
+            for name in STAGES:
+                ts = times[name]
+                row[name] = {"median_s": statistics.median(ts), "max_s": max(ts), "peak_mem_bytes": peaks[name]}
+            row["collect"]["rows_per_s"] = size / row["collect"]["median_s"]
+            row["deliver"]["messages_per_s"] = sent / row["deliver"]["median_s"]
+            row["e2e"]["reports_per_min"] = 60 / row["e2e"]["median_s"]
+            results["sizes"][size] = row
+            _print_size(size, row)
+
+        results["requests"] = dict(state.counts)
+        from metrics import metrics
+        results["metrics"] = metrics.snapshot()
+    return results
+
+def _print_size(size: int, row: Dict[str, Any]) -> None:
+    print(f"\n== {size} coins ==")
+    print(f"{'stage':<9} {'median':>9} {'max':>9} {'peak mem':>10}  throughput")
+    extra = {
+        "collect": lambda r: f"{r['rows_per_s']:,.0f} rows/s",
+        "deliver": lambda r: f"{r['messages_per_s']:,.1f} msg/s",
+        "e2e": lambda r: f"{r['reports_per_min']:,.1f} reports/min",
+    }
+    for name in STAGES:
+        r = row[name]
+        tp = extra[name](r) if name in extra else ""
+        print(f"{name:<9} {r['median_s'] * 1000:7.1f}ms {r['max_s'] * 1000:7.1f}ms "
+              f"{r['peak_mem_bytes'] / 2**20:8.2f}MB  {tp}")
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[250, 2000, 10000],
+                    help="market sizes (coins), comma separated")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--warmup", type=int, default=1, help="untimed runs per size (MCP spawn, imports)")
+    ap.add_argument("--latency-ms", type=float, default=25.0, help="per-request latency of every fake")
+    ap.add_argument("--jitter", type=float, default=0.2, help="latency jitter, fraction")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered 429/529")
+    ap.add_argument("--subscribers", type=int, default=20, help="fake chats to broadcast to")
+    ap.add_argument("--payloads", help="directory with recorded markets.json / global.json / comments.json")
+    ap.add_argument("--no-mcp", action="store_true", help="skip the fake MCP server (REST fallback path)")
+    ap.add_argument("--real-pacing", action="store_true", help="keep Telegram's broadcast rate limits")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--verbose", action="store_true", help="show the pipeline's own logging")
+    args = ap.parse_args()
+
+    results = run(args)
+    print("\nrequests served:", ", ".join(f"{k}={v}" for k, v in sorted(results["requests"].items())))
+    if not results["requests"].get("claude"):
+        print("⚠️ the Claude fake was never called: commentary fell back to defaults, so 'comments' is not measured")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print("results written to", args.json)
+    os._exit(0)  # don't wait on the resident MCP session / pools
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,171 @@
+import html
+from typing import Any, Dict, List, Optional
 from telegram.ext import Updater, CommandHandler
 from telegram import ParseMode
-from config import TELEGRAM_BOT_TOKEN
-from claude_writer import generate_daily_report
+from config import TELEGRAM_BOT_TOKEN, BOT_WORKERS, ASK_SNAPSHOT_MAX_AGE_S
+from claude_writer import generate_report
+from analyzer import latest_table
+from coin_index import get_coin_index, normalize
+from coingecko_client import get_coin_market
+from portfolio import get_portfolio_store, value_portfolios
+from renderers import render_telegram, render_portfolio
+from report_service import ReportCache
+from subscribers import get_registry
+from metrics import serve_metrics
+
+# one shared report for every chat; regenerated by a single worker at a time
+reports = ReportCache(lambda: render_telegram(generate_report()))
 
 #  /start
 def start(update, context):
     chat_id = update.effective_chat.id
     first_name = update.effective_user.first_name
+    get_registry().add(chat_id, first_name)
     context.bot.send_message(
         chat_id=chat_id,
         text=f"Hey, {first_name}! You subscbe for the Fomo Vynt bot 🥲\n Your first report will be ready on daily basis."
     )
 
-# 
+#  /stop
+def stop(update, context):
+    chat_id = update.effective_chat.id
+    get_registry().remove(chat_id)
+    context.bot.send_message(chat_id=chat_id, text="Unsubscribed. Come back with /start anytime 👋")
+
+# handlers run async (worker pool), so a regeneration never blocks other updates
 def send_report(update, context):
     chat_id = update.effective_chat.id
-    report = generate_daily_report()
-    context.bot.send_message(chat_id=chat_id, text=report, parse_mode=ParseMode.MARKDOWN)
+    try:
+        chunks = reports.get(timeout=120)
+    except Exception as e:  # timed out waiting, or the shared generation failed
+        print("Report for /report unavailable:", repr(e))
+        context.bot.send_message(chat_id=chat_id, text="Report is unavailable right now, try again later 🙏")
+        return
+    for chunk in chunks:
+        context.bot.send_message(chat_id=chat_id, text=chunk, parse_mode=ParseMode.HTML)
+
+def _coin_row(coin_id: str) -> Optional[Dict[str, Any]]:
+    """Market data for one coin: the last report's table when it has it, else one API call."""
+    table = latest_table(ASK_SNAPSHOT_MAX_AGE_S)
+    if table is not None and coin_id in table.index:
+        row = table.majors([coin_id])[coin_id]
+        row["rank"] = table.index[coin_id] + 1
+        return row
+    r = get_coin_market(coin_id)
+    if r is None or not r.current_price:
+        return None
+    return {
+        "name": r.name, "symbol": (r.symbol or "").upper(), "price": r.current_price,
+        "pct_24h": r.price_change_percentage_24h or 0.0, "high_24h": r.high_24h or 0.0,
+        "low_24h": r.low_24h or 0.0, "volume_24h": r.total_volume or 0.0, "market_cap": r.market_cap or 0.0,
+    }
+
+def _coin_card(row: Dict[str, Any]) -> str:
+    e = lambda s: html.escape(str(s), quote=False)
+    pct = row["pct_24h"]
+    lines = [
+        f"<b>{e(row['name'])} ({e(row['symbol'])})</b>" + (f" · #{row['rank']}" if row.get("rank") else ""),
+        f"💵 ${row['price']:,.6g}  {'🟢' if pct >= 0 else '🔴'} {pct:+.2f}% 24h",
+        f"📉 ${row['low_24h']:,.6g} — 📈 ${row['high_24h']:,.6g}",
+        f"📊 Vol ${row['volume_24h']:,.0f} · Cap ${row['market_cap']:,.0f}",
+    ]
+    return "\n".join(lines)
+
+#  /ask <coin>
+def ask(update, context):
+    chat_id = update.effective_chat.id
+    query = " ".join(context.args or []).strip()
+    if not query:
+        context.bot.send_message(chat_id=chat_id, text="Usage: /ask <coin>, e.g. /ask sol or /ask raydium")
+        return
+    if not get_coin_index().ready(timeout=30):
+        context.bot.send_message(chat_id=chat_id, text="Coin list is not available yet, try again in a minute 🙏")
+        return
+    coin = _resolve(query)
+    row = _coin_row(coin["id"]) if coin else None
+    if row is None:
+        context.bot.send_message(chat_id=chat_id, text=f"Couldn't find a coin for “{query}” 🤷")
+        return
+    context.bot.send_message(chat_id=chat_id, text=_coin_card(row), parse_mode=ParseMode.HTML)
+
+def _resolve(query: str) -> Optional[Dict[str, str]]:
+    """The coin `query` names; shared symbols go to the larger market cap (see CoinIndex.cap_rank)."""
+    index = get_coin_index()
+    if not index.ready(timeout=30):
+        return None
+    return index.resolve(query)
+
+def _ambiguous(query: str) -> List[Dict[str, str]]:
+    """Coins sharing the name/symbol `query` when there is no market-cap rank to pick one (else [])."""
+    index = get_coin_index()
+    same = index.exact(query)
+    if len(same) > 1 and normalize(same[0]["id"]) != normalize(query) and same[0]["id"] not in index.cap_rank():
+        return same
+    return []
+
+def _number(text: str) -> Optional[float]:
+    try:
+        v = float(text.replace(",", "").lstrip("@$"))
+    except ValueError:
+        return None
+    return v if v > 0 else None
+
+#  /add <coin> <amount> [buy price]
+def add_holding(update, context):
+    chat_id = update.effective_chat.id
+    args = context.args or []
+    amount = _number(args[1]) if len(args) >= 2 else None
+    price = _number(args[2]) if len(args) >= 3 else None
+    if amount is None or (len(args) >= 3 and price is None):
+        context.bot.send_message(chat_id=chat_id, text="Usage: /add <coin> <amount> [buy price in USD], e.g. /add sol 12 @140")
+        return
+    coin = _resolve(args[0])
+    if coin is None:
+        context.bot.send_message(chat_id=chat_id, text=f"Couldn't find a coin for “{args[0]}” 🤷")
+        return
+    same = _ambiguous(args[0])
+    if same:
+        listed = "\n".join(f"• {c['id']} ({c['name']})" for c in same[:8])
+        context.bot.send_message(chat_id=chat_id, text=f"Several coins are “{args[0]}”, add it by id instead:\n{listed}\n"
+                                                       f"e.g. /add {same[0]['id']} {args[1]}")
+        return
+    get_portfolio_store().add(chat_id, coin["id"], coin["symbol"], amount, price)
+    context.bot.send_message(chat_id=chat_id, text=f"Added {amount:g} {coin['symbol'].upper()} ({coin['name']}) ✅")
+
+#  /remove <coin>
+def remove_holding(update, context):
+    chat_id = update.effective_chat.id
+    coin = _resolve(" ".join(context.args or [])) if context.args else None
+    if coin is None or not get_portfolio_store().remove(chat_id, coin["id"]):
+        context.bot.send_message(chat_id=chat_id, text="Not in your portfolio. Usage: /remove <coin>")
+        return
+    context.bot.send_message(chat_id=chat_id, text=f"Removed {coin['symbol'].upper()} 🗑")
+
+#  /portfolio
+def show_portfolio(update, context):
+    chat_id = update.effective_chat.id
+    summary = value_portfolios(get_portfolio_store().load(chat_id), latest_table(ASK_SNAPSHOT_MAX_AGE_S)).get(chat_id)
+    if summary is None:
+        context.bot.send_message(chat_id=chat_id, text="Your portfolio is empty. Add coins with /add <coin> <amount> [buy price]")
+        return
+    for chunk in render_portfolio(summary):
+        context.bot.send_message(chat_id=chat_id, text=chunk, parse_mode=ParseMode.HTML)
 
 def main():
-    updater = Updater(token=TELEGRAM_BOT_TOKEN, use_context=True)
+    updater = Updater(token=TELEGRAM_BOT_TOKEN, use_context=True, workers=BOT_WORKERS)
     dp = updater.dispatcher
 
-    dp.add_handler(CommandHandler("start", start))
-    dp.add_handler(CommandHandler("report", send_report))  # for manual testing
+    dp.add_handler(CommandHandler("start", start, run_async=True))
+    dp.add_handler(CommandHandler("stop", stop, run_async=True))
+    dp.add_handler(CommandHandler("report", send_report, run_async=True))  # for manual testing
+    dp.add_handler(CommandHandler("ask", ask, run_async=True))
+    dp.add_handler(CommandHandler("add", add_holding, run_async=True))
+    dp.add_handler(CommandHandler("remove", remove_holding, run_async=True))
+    dp.add_handler(CommandHandler("portfolio", show_portfolio, run_async=True))
+
+    serve_metrics()
+    reports.refresh()  # warm the shared report before the first /report arrives
+    get_coin_index().ready(timeout=0)  # load or start building the coin index in the background
 
     print("🤖 Bot is running /start")
     updater.start_polling()
@@ -0,0 +1,178 @@
+# broadcast.py
+from __future__ import annotations
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence
+import requests
+from requests.adapters import HTTPAdapter
+from config import TELEGRAM_GLOBAL_RATE, TELEGRAM_PER_CHAT_INTERVAL_S, BROADCAST_CONCURRENCY
+from ratelimit import TokenBucket
+from telegram_poster import API
+from subscribers import get_registry
+from portfolio import get_portfolio_store
+from metrics import inc, span
+
+# Telegram answers these when a chat can never receive messages again
+# (a group upgraded to a supergroup is not gone: it comes with migrate_to_chat_id and is followed)
+_GONE_MARKERS = ("bot was blocked", "chat not found", "user is deactivated", "bot was kicked",
+                 "have no rights to send")
+
+@dataclass
+class BroadcastResult:
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    dropped: List[int] = field(default_factory=list)
+    migrated: Dict[int, int] = field(default_factory=dict)  # old chat id -> new (group became a supergroup)
+    elapsed_s: float = 0.0
+
+class Broadcaster:
+    """
+    Delivers one report to many chats.
+
+    Sends go through a pooled keep-alive session on a bounded worker pool;
+    pacing is a global token bucket (Telegram's ~30 msg/s) plus a minimum gap
+    per chat, so total time is set by the rate limit rather than by the
+    round-trip of each send. 429s honour `retry_after`; groups upgraded to
+    supergroups are re-sent to their new id and reported in `migrated`; chats
+    that blocked the bot or vanished are reported in `dropped`.
+    """
+
+    def __init__(self, rate_per_s: float = TELEGRAM_GLOBAL_RATE,
+                 per_chat_interval_s: float = TELEGRAM_PER_CHAT_INTERVAL_S,
+                 concurrency: int = BROADCAST_CONCURRENCY, max_retries: int = 3):
+        self.bucket = TokenBucket(rate_per_s, burst=rate_per_s)
+        self.per_chat_interval_s = per_chat_interval_s
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="tg-send")
+
+    def _post(self, chat_id: int, text: str) -> requests.Response:
+        payload = {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": "HTML",
+            "disable_web_page_preview": True,
+        }
+        with span("telegram_send", method="broadcast") as s:
+            r = self.session.post(f"{API}/sendMessage", json=payload, timeout=20)
+            s["http_status"] = r.status_code
+        return r
+
+    async def _send_chat(self, chat_id: int, texts: Sequence[str], sem: asyncio.Semaphore,
+                         result: BroadcastResult) -> None:
+        loop = asyncio.get_running_loop()
+        async with sem:
+            origin = chat_id
+            next_ok = 0.0
+            for text in texts:
+                for attempt in range(self.max_retries + 1):
+                    gap = next_ok - time.monotonic()
+                    if gap > 0:
+                        await asyncio.sleep(gap)
+                    await self.bucket.acquire_async()
+                    next_ok = time.monotonic() + self.per_chat_interval_s
+                    try:
+                        r = await loop.run_in_executor(self._pool, self._post, chat_id, text)
+                    except requests.RequestException as e:
+                        if attempt == self.max_retries:
+                            print(f"send to {chat_id} failed:", e)
+                            result.failed += 1
+                            return
+                        result.retried += 1
+                        await asyncio.sleep(2 ** attempt)
+                        continue
+
+                    if r.status_code == 200:
+                        result.sent += 1
+                        break
+                    try:
+                        body = r.json()
+                    except ValueError:
+                        body = {}
+                    desc = (body.get("description") or "").lower()
+                    params = body.get("parameters") or {}
+                    if r.status_code == 400 and params.get("migrate_to_chat_id") and attempt < self.max_retries:
+                        new_id = int(params["migrate_to_chat_id"])
+                        result.migrated[origin] = new_id
+                        chat_id = new_id
+                        result.retried += 1
+                        continue
+                    if r.status_code == 429 and attempt < self.max_retries:
+                        retry_after = float(params.get("retry_after") or 1)
+                        self.bucket.penalize(retry_after)
+                        result.retried += 1
+                        continue
+                    if r.status_code in (400, 403) and any(m in desc for m in _GONE_MARKERS):
+                        result.dropped.append(chat_id)
+                        return
+                    print(f"send to {chat_id} failed: {r.status_code} {desc}")
+                    result.failed += 1
+                    return
+
+    async def send_each_async(self, messages: Dict[int, Sequence[str]]) -> BroadcastResult:
+        """Send each chat its own message chunks (in order), under the same pacing as a broadcast."""
+        result = BroadcastResult()
+        started = time.monotonic()
+        sem = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self._send_chat(c, texts, sem, result) for c, texts in messages.items()))
+        result.elapsed_s = time.monotonic() - started
+        inc("broadcast_messages_total", result.sent, status="sent")
+        inc("broadcast_messages_total", result.failed, status="failed")
+        inc("broadcast_chats_dropped_total", len(result.dropped))
+        inc("retries_total", result.retried, service="telegram", reason="broadcast")
+        return result
+
+    async def broadcast_async(self, texts: Sequence[str], chat_ids: Iterable[int]) -> BroadcastResult:
+        """Send `texts` (message chunks, in order) to every chat in `chat_ids`."""
+        texts = list(texts)
+        return await self.send_each_async({c: texts for c in dict.fromkeys(chat_ids)})
+
+def _forget(chat_ids: List[int]) -> None:
+    """Chats that are gone for good: unsubscribe them and drop their holdings."""
+    get_registry().remove_many(chat_ids)
+    get_portfolio_store().remove_chats(chat_ids)
+
+def _follow(migrated: Dict[int, int]) -> None:
+    """Groups that became supergroups: move their subscription and holdings to the new chat id."""
+    registry, store = get_registry(), get_portfolio_store()
+    for old, new in migrated.items():
+        registry.move(old, new)
+        store.move_chat(old, new)
+
+def broadcast(texts: Sequence[str], chat_ids: Optional[Iterable[int]] = None,
+              broadcaster: Optional[Broadcaster] = None) -> BroadcastResult:
+    """
+    Sync entry point (cron / scheduler). Defaults to every registered subscriber;
+    chats that are gone for good are removed from the registry and the portfolios.
+    """
+    registry = get_registry()
+    if chat_ids is None:
+        chat_ids = registry.chat_ids()
+    b = broadcaster or Broadcaster()
+    result = asyncio.run(b.broadcast_async(list(texts), list(chat_ids)))
+    if result.migrated:
+        _follow(result.migrated)
+    if result.dropped:
+        _forget(result.dropped)
+    print(f"📣 Broadcast: {result.sent} sent, {result.failed} failed, {len(result.dropped)} dropped, "
+          f"{result.retried} retries in {result.elapsed_s:.1f}s")
+    return result
+
+def send_each(messages: Dict[int, Sequence[str]], broadcaster: Optional[Broadcaster] = None) -> BroadcastResult:
+    """Sync entry point for per-chat messages (e.g. portfolio summaries); gone chats are forgotten."""
+    b = broadcaster or Broadcaster()
+    result = asyncio.run(b.send_each_async({c: list(t) for c, t in messages.items()}))
+    if result.migrated:
+        _follow(result.migrated)
+    if result.dropped:
+        _forget(result.dropped)
+    print(f"📣 Sent {result.sent} personal message(s), {result.failed} failed, {len(result.dropped)} dropped, "
+          f"{result.retried} retries in {result.elapsed_s:.1f}s")
+    return result
@@ -1,26 +1,37 @@
-import json, html, datetime as dt
-from anthropic import Anthropic
-from config import CLAUDE_API_KEY
+import json, hashlib, math, time, threading, datetime as dt
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, List
+from config import (
+    CLAUDE_API_KEY,
+    CLAUDE_BASE_URL,
+    COMMENT_CACHE_TTL_S,
+    COMMENT_CACHE_SIZE,
+    COMMENT_CACHE_PRECISION,
+    COMMENT_CACHE_DIR,
+    COMMENT_DEADLINE_S,
+    PROMPT_TOKEN_COUNT,
+)
 from analyzer import prepare_report
+from ttl_cache import TTLCache
+from report_model import Alert, Report, build_report
+from renderers import render_telegram_html
+from metrics import metrics, inc, span
+
+CLAUDE_MODEL = "claude-3-5-haiku-latest"
+
+_anth = None
+_anth_lock = threading.Lock()
+
+def _claude():
+    """Anthropic client, built on first use (the SDK alone costs ~1s of import time)."""
+    global _anth
+    with _anth_lock:
+        if _anth is None:
+            from anthropic import Anthropic
+            _anth = Anthropic(api_key=CLAUDE_API_KEY, base_url=CLAUDE_BASE_URL)
+    return _anth
 
-anth = Anthropic(api_key=CLAUDE_API_KEY)
-
-def _e(x) -> str:
-    """Escape HTML for Telegram-safe output."""
-    return html.escape(str(x), quote=False)
-
-def _fmt_rows(rows):
-    """Format token rows with HTML-safe escaping and \\n breaks."""
-    if not rows:
-        return "—"
-    lines = []
-    for r in rows:
-        name = _e(r.get("name") or r.get("id") or "?")
-        symbol = _e((r.get("symbol") or "").upper())
-        pct = float(r.get("pct", r.get("price_change_percentage_24h", 0.0)) or 0.0)
-        price = float(r.get("price", r.get("current_price", 0.0)) or 0.0)
-        lines.append(f"{name} ({symbol}) | {'+' if pct >= 0 else ''}{pct:.2f}% | ${price:.6f}")
-    return "\n".join(lines)
+_comment_cache = TTLCache(maxsize=COMMENT_CACHE_SIZE, ttl=COMMENT_CACHE_TTL_S, disk_dir=COMMENT_CACHE_DIR)
 
 def _today():
     now = dt.datetime.now()
@@ -34,6 +45,71 @@ SYSTEM_PROMPT = (
     "Keep outputs no so short but readable."
 )
 
+CONTEXT_LEGEND = (
+    "Context keys: d=date; g=global (cap_T=market cap $T, vol_B=24h volume $B, chg=24h %, dom=BTC dominance %); "
+    "mj=majors SYM:[24h %, price $, 24h low, 24h high]; up/dn=top gainers/losers [SYM, name, 24h %]; "
+    "odd=strange activity [SYM, name, 24h %]; fomo=[SYM, 24h %] ($100 in yesterday = 100+pct)."
+)
+
+def _encode_context(data: dict) -> dict:
+    """
+    Compact context for the prompt: only what the comment schema needs,
+    short keys (see CONTEXT_LEGEND), % to 1 decimal, prices to 4 significant digits.
+    """
+    def pct(x):
+        try:
+            return round(float(x or 0.0), 1)
+        except Exception:
+            return 0.0
+
+    def movers(rows):
+        out = []
+        for r in rows or []:
+            sym = (r.get("symbol") or "").upper()
+            name = r.get("name") or ""
+            out.append([sym, "" if name.upper() == sym else name,
+                        pct(r.get("pct", r.get("price_change_percentage_24h")))])
+        return out
+
+    g = data.get("global") or {}
+    out = {
+        "d": data.get("date"),
+        "g": {
+            "cap_T": round(float(g.get("market_cap_usd") or 0) / 1e12, 2),
+            "vol_B": round(float(g.get("volume_usd") or 0) / 1e9),
+            "chg": pct(g.get("market_cap_change_24h_pct")),
+            "dom": pct(g.get("btc_dominance_pct")),
+        },
+        "mj": {
+            (m.get("symbol") or cid).upper(): [pct(m.get("pct_24h")), _sig(m.get("price"), 4),
+                                               _sig(m.get("low_24h"), 4), _sig(m.get("high_24h"), 4)]
+            for cid, m in (data.get("majors") or {}).items()
+        },
+        "up": movers(data.get("gainers")),
+        "dn": movers(data.get("losers")),
+        "odd": movers(data.get("strange")),
+        "fomo": [[(r.get("symbol") or "").upper(), pct(r.get("pct", r.get("price_change_percentage_24h")))]
+                 for r in (data.get("fomo") or [])],
+    }
+    return {k: v for k, v in out.items() if v not in ([], {}, None)}
+
+def _estimate_tokens(text: str) -> int:
+    """Offline estimate (~3.5 chars per token for JSON-heavy text)."""
+    return math.ceil(len(text) / 3.5)
+
+def _count_tokens(prompt: str) -> int:
+    """Exact count via the API when PROMPT_TOKEN_COUNT=api, else the offline estimate."""
+    if PROMPT_TOKEN_COUNT == "api":
+        try:
+            return _claude().messages.count_tokens(
+                model=CLAUDE_MODEL,
+                system=SYSTEM_PROMPT,
+                messages=[{"role": "user", "content": prompt}],
+            ).input_tokens
+        except Exception as e:
+            print("Token count via API failed:", e)
+    return _estimate_tokens(prompt)
+
 def _build_comment_prompt(data: dict) -> str:
     """
     Ask Claude for JUST comments, returned as compact JSON:
@@ -45,6 +121,7 @@ def _build_comment_prompt(data: dict) -> str:
         "losers_notes": {"SYMBOL": "note <= 80 chars", ...}
       }
     If unsure, use '—'. No markdown, no tables.
+    Context goes in the compact _encode_context form.
     """
     g_symbols = [ (r.get("symbol") or "").upper() for r in (data.get("gainers") or []) ]
     l_symbols = [ (r.get("symbol") or "").upper() for r in (data.get("losers") or []) ]
@@ -55,26 +132,113 @@ def _build_comment_prompt(data: dict) -> str:
         "gainers_notes": {s: "" for s in g_symbols},
         "losers_notes": {s: "" for s in l_symbols},
     }
-    return (
+    head = (
         "Return ONLY valid JSON matching this exact shape and key set.\n"
         "Lengths: fomo<=180, market_comment<=220, majors_comment<=220, per-token notes<=80.\n"
         "If unsure, put '—'. No markdown, no code fences.\n\n"
-        + json.dumps(template, ensure_ascii=False)
-        + "\n\nContext data:\n"
-        + json.dumps(data, ensure_ascii=False)
+        + json.dumps(template, ensure_ascii=False, separators=(",", ":"))
+    )
+    prompt = (
+        head
+        + "\n\n" + CONTEXT_LEGEND + "\nContext data:\n"
+        + json.dumps(_encode_context(data), ensure_ascii=False, separators=(",", ":"))
     )
+    print(f"🧮 Prompt tokens: ~{_count_tokens(prompt)}")
+    return prompt
+
+DEFAULT_COMMENTS = {
+    "fomo": "Market feels range-bound; if you missed a pump, breathe. Monday-mode: on.",
+    "market_comment": "Cautious bid persists; liquidity pockets drive selective moves.",
+    "majors_comment": "BTC steady, ETH waiting for catalyst, SOL resilient on dips.",
+    "gainers_notes": {},
+    "losers_notes": {},
+}
+
+# shown in the first (numbers-only) message of a progressive delivery
+PENDING_COMMENTS = {
+    "fomo": "⏳ Commentary on the way…",
+    "market_comment": "—",
+    "majors_comment": "—",
+    "gainers_notes": {},
+    "losers_notes": {},
+}
+
+def _sig(x, digits: int = 3) -> float:
+    """Round to `digits` significant figures (prices and USD totals)."""
+    try:
+        x = float(x or 0.0)
+    except Exception:
+        return 0.0
+    if x == 0 or not math.isfinite(x):
+        return 0.0
+    return round(x, digits - 1 - int(math.floor(math.log10(abs(x)))))
+
+def _comment_cache_key(payload: dict) -> str:
+    """
+    Hash of the payload as Claude would 'see' it: % values rounded to
+    COMMENT_CACHE_PRECISION decimals, USD figures to 3 significant digits,
+    token lists reduced to their symbol sets.
+    """
+    p = COMMENT_CACHE_PRECISION
+
+    def pct(x):
+        try:
+            return round(float(x or 0.0), p)
+        except Exception:
+            return 0.0
 
+    def syms(rows):
+        return sorted({(r.get("symbol") or "").upper() for r in (rows or [])})
+
+    g = payload.get("global") or {}
+    norm = {
+        "date": payload.get("date"),
+        "global": {
+            "cap": _sig(g.get("market_cap_usd")),
+            "vol": _sig(g.get("volume_usd")),
+            "chg": pct(g.get("market_cap_change_24h_pct")),
+            "dom": pct(g.get("btc_dominance_pct")),
+        },
+        "majors": {
+            cid: {"pct": pct(m.get("pct_24h")), "price": _sig(m.get("price"))}
+            for cid, m in sorted((payload.get("majors") or {}).items())
+        },
+        "gainers": syms(payload.get("gainers")),
+        "losers": syms(payload.get("losers")),
+        "strange": syms(payload.get("strange")),
+        "fomo": syms(payload.get("fomo")),
+    }
+    return hashlib.sha256(json.dumps(norm, sort_keys=True).encode()).hexdigest()
+
+@metrics.timed("comments")
 def _get_comments(payload: dict) -> dict:
-    """Call Claude to get comment JSON; fall back to defaults on failure."""
+    """
+    Call Claude to get comment JSON; fall back to defaults on failure.
+    Answers are cached by _comment_cache_key, so near-identical payloads
+    within COMMENT_CACHE_TTL_S skip the LLM call.
+    """
+    cache_key = _comment_cache_key(payload)
+    cached = _comment_cache.get(cache_key)
+    if cached is not None:
+        inc("cache_hits_total", cache="comments")
+        return cached
+    inc("cache_misses_total", cache="comments")
+
     prompt = _build_comment_prompt(payload)
     try:
-        msg = anth.messages.create(
-            model="claude-3-5-haiku-latest",
-            max_tokens=700,
-            temperature=0.5,
-            system=SYSTEM_PROMPT,
-            messages=[{"role": "user", "content": prompt}],
-        )
+        with span("claude_call", model=CLAUDE_MODEL) as s:
+            msg = _claude().messages.create(
+                model=CLAUDE_MODEL,
+                max_tokens=700,
+                temperature=0.5,
+                system=SYSTEM_PROMPT,
+                messages=[{"role": "user", "content": prompt}],
+            )
+            usage = getattr(msg, "usage", None)
+            if usage is not None:
+                s["input_tokens"], s["output_tokens"] = usage.input_tokens, usage.output_tokens
+                inc("claude_tokens_total", usage.input_tokens, kind="input")
+                inc("claude_tokens_total", usage.output_tokens, kind="output")
         raw = (msg.content[0].text if msg and msg.content else "").strip()
         # Extract JSON if Claude wrapped it
         start = raw.find("{")
@@ -91,20 +255,55 @@ def _get_comments(payload: dict) -> dict:
             data["gainers_notes"] = {}
         if not isinstance(data.get("losers_notes"), dict):
             data["losers_notes"] = {}
+        _comment_cache.set(cache_key, data)  # fallbacks below are never cached
         return data
-    except Exception:
-        return {
-            "fomo": "Market feels range-bound; if you missed a pump, breathe. Monday-mode: on.",
-            "market_comment": "Cautious bid persists; liquidity pockets drive selective moves.",
-            "majors_comment": "BTC steady, ETH waiting for catalyst, SOL resilient on dips.",
-            "gainers_notes": {},
-            "losers_notes": {},
-        }
+    except Exception as e:
+        print("Claude commentary failed, using default text:", e)
+        inc("fallbacks_total", path="claude_to_default", reason="error")
+        return dict(DEFAULT_COMMENTS)
 
-def generate_daily_report() -> str:
-    D = prepare_report(top_n=5)
+@metrics.timed("alert_comments")
+def comment_alerts(alerts: List[Alert]) -> List[Alert]:
+    """
+    One short Claude call for a batch of intraday deltas: a one-liner per alert.
+    Only the deltas are sent (never the full market), answers are cached by the
+    alerts' content, and on any failure the alerts go out without comments.
+    """
+    items = {a.key: f"{a.title}: {a.detail}" for a in alerts}
+    cache_key = "alerts:" + hashlib.sha256(json.dumps(items, sort_keys=True).encode()).hexdigest()
+    notes = _comment_cache.get(cache_key)
+    if notes is None:
+        prompt = (
+            "Intraday crypto alerts (key: what changed). For each key write one short line (max 18 words) "
+            "on what the move likely means. No financial advice. Return ONLY JSON {key: line}.\n"
+            + json.dumps(items, ensure_ascii=False, separators=(",", ":"))
+        )
+        try:
+            with span("claude_call", model=CLAUDE_MODEL, purpose="alerts"):
+                msg = _claude().messages.create(
+                    model=CLAUDE_MODEL,
+                    max_tokens=60 * len(items) + 50,
+                    system=SYSTEM_PROMPT,
+                    messages=[{"role": "user", "content": prompt}],
+                )
+            raw = (msg.content[0].text if msg and msg.content else "").strip()
+            notes = json.loads(raw[raw.find("{"):raw.rfind("}") + 1])
+            if not isinstance(notes, dict):
+                raise ValueError("not an object")
+            _comment_cache.set(cache_key, notes)
+        except Exception as e:
+            print("Claude alert comments failed, posting numbers only:", e)
+            inc("fallbacks_total", path="claude_to_default", reason="alerts")
+            return alerts
+    for a in alerts:
+        a.comment = str(notes.get(a.key) or "")
+    return alerts
 
-    payload = {
+def build_payload(top_n: int = 5) -> dict:
+    """Collect market data and shape it into the payload Claude and the renderer share."""
+    D = prepare_report(top_n=top_n)
+
+    return {
         "date": _today(),
         "global": D.get("global"),
         "majors": D.get("majors"),
@@ -115,87 +314,44 @@ def generate_daily_report() -> str:
         "notes": {"global_change_24h": D.get("global_change_24h")},
     }
 
-    comments = _get_comments(payload)
-    fomo_txt = _e(comments.get("fomo", "—"))
-    market_c = _e(comments.get("market_comment", "—"))
-    majors_c = _e(comments.get("majors_comment", "—"))
-    g_notes  = { (k or "").upper(): _e(v) for k, v in (comments.get("gainers_notes") or {}).items() if v }
-    l_notes  = { (k or "").upper(): _e(v) for k, v in (comments.get("losers_notes") or {}).items() if v }
-
-    g = payload.get("global") or {}
-    m = payload.get("majors") or {}
-
-    market_cap = g.get("market_cap_usd", 0)
-    vol_usd    = g.get("volume_usd", 0)
-    dom_btc    = g.get("btc_dominance_pct", 0.0)
-    mkt_chg    = g.get("market_cap_change_24h_pct", 0.0)
-
-    def _mj(key, label):
-        row = m.get(key) or {}
-        if not row:
-            return f"{label}: n/a"
-        return (
-            f"{label}: "
-            f"{'+' if float(row.get('pct_24h', 0)) >= 0 else ''}{float(row.get('pct_24h', 0)):.2f}% "
-            f"(${float(row.get('price', 0)):.2f}) "
-            f"range ${float(row.get('low_24h', 0)):.0f}-${float(row.get('high_24h', 0)):.0f} "
-            f"vol ${float(row.get('volume_24h', 0)):.0f}"
-        )
+def render_report(payload: dict, comments: dict) -> str:
+    """Telegram HTML for a payload plus Claude's comments (single string, unsplit)."""
+    return render_telegram_html(build_report(payload, comments))
 
-    parts = []
+@metrics.timed("report")
+def generate_report(top_n: int = 5) -> Report:
+    """One data fetch and one Claude call; render the result for any platform (see renderers.py)."""
+    payload = build_payload(top_n=top_n)
+    return build_report(payload, _get_comments(payload))
 
-    # 🔥 FOMO & Takeaways (only Claude text)
-    parts.append(f"🔥 <b>FOMO & Takeaways</b>\n{fomo_txt}")
+def generate_daily_report() -> str:
+    return render_telegram_html(generate_report())
 
-    # 📊 Market Overview (our numbers) + 1 comment
-    parts.append(
-        "📊 <b>Market Overview</b>\n"
-        f"Cap ${market_cap:,.0f} | 24h {('+' if mkt_chg >= 0 else '')}{mkt_chg:.2f}% | "
-        f"Vol ${vol_usd:,.0f} | BTC dom {dom_btc:.2f}%"
-    )
-    if market_c and market_c != "—":
-        parts.append(f"<i>{market_c}</i>")
-
-    # 🪙 Majors + 1 comment
-    parts.append(
-        "🪙 <b>Majors</b>\n"
-        + _e(_mj("bitcoin", "BTC")) + "\n"
-        + _e(_mj("ethereum", "ETH")) + "\n"
-        + _e(_mj("solana", "SOL"))
-    )
-    if majors_c and majors_c != "—":
-        parts.append(f"<i>{majors_c}</i>")
-
-    # 🚀 Gainers (table + per-token bullets if present)
-    parts.append("🚀 <b>Top Gainers (24h)</b>\n" + _fmt_rows(payload["gainers"]))
-    if g_notes:
-        lines = []
-        for r in payload["gainers"]:
-            sym = (r.get("symbol") or "").upper()
-            note = g_notes.get(sym)
-            if note:
-                lines.append(f"• {sym}: {note}")
-        if lines:
-            parts.append("\n".join(lines))
-
-    # 💀 Losers (table + per-token bullets if present)
-    parts.append("💀 <b>Top Losers (24h)</b>\n" + _fmt_rows(payload["losers"]))
-    if l_notes:
-        lines = []
-        for r in payload["losers"]:
-            sym = (r.get("symbol") or "").upper()
-            note = l_notes.get(sym)
-            if note:
-                lines.append(f"• {sym}: {note}")
-        if lines:
-            parts.append("\n".join(lines))
+def generate_progressive_report(send: Callable[[Report], Any], edit: Callable[[Any, Report], Any],
+                                deadline: float = COMMENT_DEADLINE_S) -> Report:
+    """
+    Deliver the numbers first, then the commentary:
+    Claude is asked as soon as the data is in, the numbers-only report goes out
+    via `send` (which returns a message handle), and the full report replaces
+    it via `edit(handle, report)` when Claude answers. After `deadline` seconds the
+    default commentary is used instead. Returns the final report.
+    """
+    payload = build_payload(top_n=5)
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="claude")
+    started = time.monotonic()
+    future = pool.submit(_get_comments, payload)
+    pool.shutdown(wait=False)
 
-    # 🧐 Strange Activity (table only)
-    strange_txt = _fmt_rows(payload["strange"])
-    if strange_txt.strip() == "—":
-        strange_txt = "None today."
-    parts.append("🧐 <b>Strange Activity</b>\n" + strange_txt)
+    handle = send(build_report(payload, PENDING_COMMENTS))
 
-    # no MCP cross-check / no sources badge (per your request)
+    try:
+        comments = future.result(timeout=max(0.0, deadline - (time.monotonic() - started)))
+    except FutureTimeout:
+        print(f"Claude missed the {deadline:.0f}s commentary deadline, using default text")
+        inc("fallbacks_total", path="claude_to_default", reason="deadline")
+        comments = dict(DEFAULT_COMMENTS)
 
-    return "\n\n".join(parts)
+    final = build_report(payload, comments)
+    if handle is not None:
+        edit(handle, final)
+    return final
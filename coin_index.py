@@ -0,0 +1,251 @@
+# coin_index.py
+from __future__ import annotations
+import difflib
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config import COIN_INDEX_PATH, COIN_INDEX_REFRESH_S, COIN_RANK_REFRESH_S, SNAPSHOT_DB
+from metrics import inc, span
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+def normalize(text: str) -> str:
+    """'Raydium ' / 'raydium' / 'RAY-dium' -> comparable key."""
+    return _NON_ALNUM.sub(" ", (text or "").lower()).strip()
+
+def _grams(key: str) -> List[str]:
+    padded = f" {key} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+class _Tables:
+    """
+    Immutable lookup structures for one coin list (swapped as a whole on refresh):
+    - exact:  normalized id / symbol / name -> coin positions
+    - keys:   sorted unique normalized keys (binary search for prefixes), each -> coin positions
+    - grams:  trigram -> key positions, as int32 arrays (fuzzy candidates are counted with bincount)
+    """
+
+    def __init__(self, coins: List[Tuple[str, str, str]]):
+        self.ids = [c[0] for c in coins]
+        self.symbols = [c[1] for c in coins]
+        self.names = [c[2] for c in coins]
+        self.exact: Dict[str, List[int]] = {}
+        for i, (cid, sym, name) in enumerate(coins):
+            for k in {normalize(cid), normalize(sym), normalize(name)}:
+                if k:
+                    self.exact.setdefault(k, []).append(i)
+        self.keys = sorted(self.exact)
+        grams: Dict[str, List[int]] = {}
+        for ki, k in enumerate(self.keys):
+            for g in set(_grams(k)):
+                grams.setdefault(g, []).append(ki)
+        self.grams = {g: np.array(v, dtype=np.int32) for g, v in grams.items()}
+
+class CoinIndex:
+    """
+    Local index of every CoinGecko coin (id, symbol, name) for resolving what a
+    user typed without a network round trip.
+
+    The list is persisted to COIN_INDEX_PATH and refreshed from /coins/list in
+    the background once older than COIN_INDEX_REFRESH_S; lookups keep using the
+    previous tables until the new ones are built. Lookups are exact (id, symbol
+    or name), then prefix (binary search over sorted keys), then fuzzy
+    (trigram candidates ranked by similarity). Ties go to the coin with the
+    better `rank`, by default its market-cap position (see cap_rank).
+    """
+
+    def __init__(self, path: str = COIN_INDEX_PATH, max_age: float = COIN_INDEX_REFRESH_S):
+        self.path = path
+        self.max_age = max_age
+        self._tables: Optional[_Tables] = None
+        self._ts = 0.0
+        self._lock = threading.Lock()
+        self._building: Optional["Future[None]"] = None
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="coin-index")
+        self._rank: Dict[str, int] = {}
+        self._rank_read = float("-inf")
+        self._load()
+
+    def __len__(self) -> int:
+        t = self._tables
+        return len(t.ids) if t else 0
+
+    @property
+    def age(self) -> float:
+        return time.time() - self._ts if self._tables is not None else float("inf")
+
+    # ----------------- persistence / refresh -----------------
+
+    def _set(self, coins: List[Tuple[str, str, str]], ts: float) -> None:
+        tables = _Tables(coins)
+        with self._lock:
+            self._tables, self._ts = tables, ts
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self._set([tuple(c) for c in raw["coins"]], float(raw["ts"]))
+        except Exception as e:
+            print("Coin index file unreadable, will rebuild:", e)
+
+    def _save(self, coins: List[Tuple[str, str, str]], ts: float) -> None:
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"ts": ts, "coins": coins}, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print("Coin index write failed:", e)
+
+    def _build(self) -> None:
+        from coingecko_client import get_coins_list
+        with span("coin_index_refresh") as s:
+            rows = get_coins_list()
+            coins = [(r["id"], r.get("symbol") or "", r.get("name") or r["id"])
+                     for r in rows if isinstance(r, dict) and r.get("id")]
+            s["coins"] = len(coins)
+        if not coins:
+            raise RuntimeError("empty /coins/list")
+        ts = time.time()
+        self._set(coins, ts)
+        self._save(coins, ts)
+        print(f"🔎 Coin index: {len(coins)} coins")
+
+    def refresh(self) -> "Future[None]":
+        """Start a rebuild unless one is already running; returns its future."""
+        with self._lock:
+            if self._building is None or self._building.done():
+                self._building = self._pool.submit(self._build)
+            return self._building
+
+    def ready(self, timeout: Optional[float] = None) -> bool:
+        """Start a refresh when stale; wait for it only if there is no index at all."""
+        if self.age < self.max_age:
+            return True
+        fut = self.refresh()
+        if self._tables is None and timeout != 0:
+            try:
+                fut.result(timeout=timeout)
+            except Exception as e:
+                print("Coin index build failed:", e)
+        return self._tables is not None
+
+    def cap_rank(self) -> Dict[str, int]:
+        """
+        coin id -> market-cap position, used to break ties between coins sharing a
+        symbol or name. Read from the latest stored snapshot (SNAPSHOT_DB, written
+        by whichever process runs the reports; any age will do, the order moves
+        slowly) every COIN_RANK_REFRESH_S; without a store, the last report's
+        table in this process. {} when neither has been seen yet.
+        """
+        now = time.monotonic()
+        if now - self._rank_read < COIN_RANK_REFRESH_S and self._rank:
+            return self._rank
+        rank: Dict[str, int] = {}
+        if SNAPSHOT_DB:
+            try:
+                from snapshot_store import get_store
+                rank = get_store(SNAPSHOT_DB).cap_rank()
+            except Exception as e:
+                print("Market-cap rank unavailable from the snapshot store:", e)
+        if not rank:
+            from analyzer import latest_table
+            table = latest_table(float("inf"))
+            rank = dict(table.index) if table is not None else {}
+        if rank:
+            self._rank, self._rank_read = rank, now
+        return self._rank
+
+    # ----------------- lookup -----------------
+
+    def _ranked(self, t: _Tables, positions: List[int], rank: Optional[Dict[str, int]], q: str = "") -> List[int]:
+        # a coin whose id is the query itself comes first, then market-cap order
+        if len(positions) < 2:
+            return positions
+        rank = rank or self.cap_rank()
+        worst = len(rank) + 1
+        return sorted(positions, key=lambda i: (normalize(t.ids[i]) != q, rank.get(t.ids[i], worst)))
+
+    def _coins(self, t: _Tables, positions: List[int]) -> List[Dict[str, str]]:
+        return [{"id": t.ids[i], "symbol": t.symbols[i], "name": t.names[i]} for i in positions]
+
+    def _prefix(self, t: _Tables, q: str, cap: int = 2000) -> List[int]:
+        # keys are [a-z0-9 ]; "{" sorts after all of them, so [q, q + "{") is the prefix range
+        lo, hi = bisect_left(t.keys, q), bisect_left(t.keys, q + "{")
+        out: List[int] = []
+        for k in t.keys[lo:min(hi, lo + cap)]:
+            out.extend(t.exact[k])
+        return out
+
+    def _fuzzy(self, t: _Tables, q: str, limit: int, cutoff: float) -> List[int]:
+        postings = [t.grams[g] for g in set(_grams(q)) if g in t.grams]
+        if not postings:
+            return []
+        hits = np.bincount(np.concatenate(postings), minlength=len(t.keys))
+        cand = np.flatnonzero(hits >= max(1, hits.max() // 2))
+        cand = cand[np.argsort(-hits[cand], kind="stable")][:200]
+        scored = []
+        for ki in cand.tolist():
+            ratio = difflib.SequenceMatcher(None, q, t.keys[ki]).ratio()
+            if ratio >= cutoff:
+                scored.append((ratio, ki))
+        scored.sort(key=lambda x: -x[0])
+        out: List[int] = []
+        for _, ki in scored[:limit]:
+            out.extend(t.exact[t.keys[ki]])
+        return out
+
+    def lookup(self, text: str, limit: int = 5, rank: Optional[Dict[str, int]] = None,
+               cutoff: float = 0.75) -> List[Dict[str, str]]:
+        """Best matches for `text`, most likely first: [{"id", "symbol", "name"}, ...]."""
+        t = self._tables
+        q = normalize(text)
+        if t is None or not q:
+            return []
+        for kind, find in (("exact", lambda: list(t.exact.get(q, []))),
+                           ("prefix", lambda: self._prefix(t, q) if len(q) >= 3 else []),
+                           ("fuzzy", lambda: self._fuzzy(t, q, limit, cutoff) if len(q) >= 4 else [])):
+            found = find()
+            if found:
+                inc("coin_lookups_total", match=kind)
+                seen = list(dict.fromkeys(found))
+                return self._coins(t, self._ranked(t, seen, rank, q)[:limit])
+        inc("coin_lookups_total", match="none")
+        return []
+
+    def exact(self, text: str, rank: Optional[Dict[str, int]] = None) -> List[Dict[str, str]]:
+        """Every coin whose id, symbol or name is exactly `text`, best ranked first."""
+        t = self._tables
+        if t is None:
+            return []
+        q = normalize(text)
+        return self._coins(t, self._ranked(t, list(t.exact.get(q, [])), rank, q))
+
+    def resolve(self, text: str, rank: Optional[Dict[str, int]] = None) -> Optional[Dict[str, str]]:
+        """The coin `text` names: the whole text first ("shiba inu"), then its first word ("sol price")."""
+        found = self.lookup(text, limit=1, rank=rank)
+        words = normalize(text).split()
+        if not found and len(words) > 1:
+            found = self.lookup(words[0], limit=1, rank=rank)
+        return found[0] if found else None
+
+_index: Optional[CoinIndex] = None
+_index_lock = threading.Lock()
+
+def get_coin_index() -> CoinIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = CoinIndex()
+        return _index
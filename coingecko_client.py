@@ -1,14 +1,40 @@
 # coingecko_client.py
 from __future__ import annotations
 import os
+import time
+import random
+import threading
 import requests
-from typing import List, Tuple, Dict, Any, Optional
-from dotenv import load_dotenv
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Iterator, List, Tuple, Dict, Any, Optional
+from urllib.parse import urlencode
+from market_table import MarketTable
+from market_records import MarketRecord, decode_markets, from_dicts, loads
+from ttl_cache import TTLCache
+from ratelimit import TokenBucket, parse_retry_after
+from config import COINGECKO_API_KEY
+from metrics import inc, span
 
-load_dotenv()
+BASE = os.getenv("COINGECKO_BASE_URL", "https://pro-api.coingecko.com/api/v3").rstrip("/")
 
-COINGECKO_API_KEY = os.getenv("COINGECKO_API_KEY")
-BASE = "https://pro-api.coingecko.com/api/v3"
+# Plan limits: requests per minute and how many market pages may be in flight at once
+RATE_LIMIT_PER_MIN = int(os.getenv("COINGECKO_RATE_LIMIT_PER_MIN", "500"))
+RATE_LIMIT_BURST = float(os.getenv("COINGECKO_RATE_LIMIT_BURST", "5"))
+SCAN_CONCURRENCY = int(os.getenv("COINGECKO_SCAN_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.getenv("COINGECKO_MAX_RETRIES", "4"))
+MAX_SCAN_PAGES = 80  # ~20k coins, upper bound for a whole-universe scan
+STOP_POLL_S = 0.1    # how often a stoppable page walk checks its stop flag while waiting
+
+# Response cache: seconds a response stays fresh, per endpoint (0 disables caching)
+CACHE_TTLS: Dict[str, float] = {
+    "/global": 60,
+    "/coins/markets": 60,
+    "/coins/list": 6 * 3600,
+    "/exchange_rates": 300,
+    "/simple/price": 30,
+}
+DEFAULT_CACHE_TTL = float(os.getenv("COINGECKO_CACHE_TTL", "30"))
+CACHE_DIR = os.getenv("COINGECKO_CACHE_DIR")  # set to persist responses across runs
 
 _session = requests.Session()
 _session.headers.update({
@@ -17,15 +43,117 @@ _session.headers.update({
     "User-Agent": "cg-tg-bot/1.0"
 })
 
-def _get(path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+# one bucket for every CoinGecko call in the process (REST and MCP alike)
+_limiter = TokenBucket.per_minute(RATE_LIMIT_PER_MIN, burst=RATE_LIMIT_BURST)
+_cache = TTLCache(maxsize=512, ttl=DEFAULT_CACHE_TTL, disk_dir=CACHE_DIR)
+
+def _cache_key(path: str, params: Dict[str, Any]) -> str:
+    return f"{path}?{urlencode(sorted((k, str(v)) for k, v in params.items()))}"
+
+_inflight: Dict[str, "Future[Any]"] = {}
+_inflight_lock = threading.Lock()
+
+def _fetch(path: str, params: Dict[str, Any], headers: Dict[str, str]) -> requests.Response:
+    """One logical request: paced by the token bucket, retried on 429/5xx/network errors."""
     url = f"{BASE}{path}"
-    r = _session.get(url, params=params or {}, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    for attempt in range(MAX_RETRIES + 1):
+        _limiter.acquire()
+        backoff = min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+        try:
+            r = _session.get(url, params=params, headers=headers, timeout=30)
+        except requests.RequestException as e:
+            if attempt == MAX_RETRIES:
+                raise
+            print(f"CoinGecko {path} failed ({e}), retry in {backoff:.1f}s")
+            inc("retries_total", service="coingecko", reason="network")
+            time.sleep(backoff)
+            continue
+        if r.status_code == 429 and attempt < MAX_RETRIES:
+            wait_s = parse_retry_after(r.headers.get("Retry-After"), backoff)
+            print(f"CoinGecko 429 on {path}, backing off {wait_s:.1f}s")
+            inc("retries_total", service="coingecko", reason="429")
+            _limiter.penalize(wait_s)
+            continue
+        if r.status_code >= 500 and attempt < MAX_RETRIES:
+            print(f"CoinGecko {r.status_code} on {path}, retry in {backoff:.1f}s")
+            inc("retries_total", service="coingecko", reason="5xx")
+            time.sleep(backoff)
+            continue
+        if r.status_code < 400:
+            _limiter.reward()
+        return r
+    return r
 
-def get_markets(per_page: int = 250, vs_currency: str = "usd", page: int = 1) -> List[Dict[str, Any]]:
+def _get(path: str, params: Optional[Dict[str, Any]] = None, ttl: Optional[float] = None,
+         decode: Callable[[bytes], Any] = loads) -> Any:
     """
-    
+    GET against the CoinGecko API, served from the response cache while fresh.
+    Stale entries are revalidated with If-None-Match / If-Modified-Since when
+    the API sent validators, so a 304 costs no payload. Identical requests
+    already in flight are coalesced: followers wait for the leader's result.
+    `decode` turns the raw body into the cached value (default: fastest JSON backend).
+    """
+    params = params or {}
+    ttl = CACHE_TTLS.get(path, DEFAULT_CACHE_TTL) if ttl is None else ttl
+    key = _cache_key(path, params)
+    entry = _cache.get_entry(key) if ttl > 0 else None
+    if entry is not None and time.time() - entry[0] < ttl:
+        inc("cache_hits_total", cache="coingecko", endpoint=path)
+        return entry[1]
+
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = Future()
+    if not leader:
+        inc("coalesced_requests_total", endpoint=path)
+        return flight.result()
+
+    try:
+        # another leader may have stored this key between our cache miss and taking the flight
+        entry = _cache.get_entry(key) if ttl > 0 else None
+        if entry is not None and time.time() - entry[0] < ttl:
+            inc("cache_hits_total", cache="coingecko", endpoint=path)
+            flight.set_result(entry[1])
+            return entry[1]
+        inc("cache_misses_total", cache="coingecko", endpoint=path)
+        headers = {}
+        if entry is not None:
+            meta = entry[2]
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        with span("coingecko_request", endpoint=path) as s:
+            r = _fetch(path, params, headers)
+            s["http_status"] = r.status_code
+        if r.status_code == 304 and entry is not None:
+            inc("cache_revalidated_total", cache="coingecko", endpoint=path)
+            _cache.touch(key)
+            data = entry[1]
+        else:
+            r.raise_for_status()
+            data = decode(r.content)
+            if ttl > 0:
+                _cache.set(key, data, meta={
+                    "etag": r.headers.get("ETag"),
+                    "last_modified": r.headers.get("Last-Modified"),
+                })
+        flight.set_result(data)
+        return data
+    except BaseException as e:
+        flight.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+def get_markets(per_page: int = 250, vs_currency: str = "usd", page: int = 1) -> List[MarketRecord]:
+    """
+    One page of /coins/markets ordered by market cap, decoded straight into
+    compact records (only the fields the analyzer reads; dict-style .get works).
     """
     params = {
         "vs_currency": vs_currency,
@@ -36,43 +164,181 @@ def get_markets(per_page: int = 250, vs_currency: str = "usd", page: int = 1) ->
         "price_change_percentage": "24h",
         "locale": "en"
     }
-    data = _get("/coins/markets", params)
+    data = _get("/coins/markets", params, decode=decode_markets)
     if isinstance(data, list):
-        return data
+        # entries reloaded from the disk cache come back as plain dicts
+        return data if not data or isinstance(data[0], MarketRecord) else from_dicts(data)
     return []
 
-def get_top_gainers_losers(top_n: int = 5, per_page: int = 250, vs_currency: str = "usd"
-                           ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+def estimate_scan_seconds(pages: int) -> float:
+    """Lower bound for a scan of `pages` pages imposed by the plan's rate limit."""
+    return max(0, pages - 1) * _limiter.interval
+
+def iter_markets_pages(pages: int = 1, per_page: int = 250, vs_currency: str = "usd",
+                       concurrency: int = SCAN_CONCURRENCY, strict: bool = False,
+                       stop: Optional[threading.Event] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yield /coins/markets pages in market-cap order as they arrive, with at most
+    `concurrency` pages in flight or waiting to be consumed (memory stays bounded).
+    pages <= 0 scans the whole list, stopping at the first short page.
+    Failed pages are skipped, or raise RuntimeError when `strict`. Setting `stop`
+    ends the walk within STOP_POLL_S even while pages are still in flight.
+    """
+    last = pages if pages > 0 else MAX_SCAN_PAGES
+    concurrency = max(1, concurrency)
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="cg-scan")
+    in_flight: Dict[Any, int] = {}
+    ready: Dict[int, Optional[List[Dict[str, Any]]]] = {}
+    next_page = 1  # next page to request
+    emit = 1       # next page to hand out
+    try:
+        while emit <= last:
+            while next_page <= last and len(in_flight) + len(ready) < concurrency:
+                fut = pool.submit(get_markets, per_page, vs_currency, next_page)
+                in_flight[fut] = next_page
+                next_page += 1
+            if stop is not None and stop.is_set():
+                return
+            if emit not in ready:
+                done, _ = wait(in_flight, timeout=STOP_POLL_S if stop is not None else None,
+                               return_when=FIRST_COMPLETED)
+                for fut in done:
+                    page = in_flight.pop(fut)
+                    try:
+                        rows = fut.result()
+                    except Exception as e:
+                        print(f"markets page {page} failed:", e)
+                        rows = None
+                    ready[page] = rows
+                    if rows is not None and len(rows) < per_page:
+                        last = min(last, page)
+                continue
+            rows = ready.pop(emit)
+            if rows is None and strict:
+                inc("rest_partial_scans_total")
+                raise RuntimeError(f"markets page {emit} failed, scan would be partial")
+            emit += 1
+            if rows:
+                yield rows
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def get_markets_pages(pages: int = 1, per_page: int = 250, vs_currency: str = "usd",
+                      concurrency: int = SCAN_CONCURRENCY, strict: bool = False) -> List[Dict[str, Any]]:
     """
-  
+    Walk several /coins/markets pages with at most `concurrency` requests in flight.
+    pages <= 0 scans the whole list, stopping at the first short page.
+    Failed pages are skipped (or raise when `strict`); rows come back in market-cap order.
     """
-    rows = get_markets(per_page=per_page, vs_currency=vs_currency, page=1)
+    if pages == 1:
+        return get_markets(per_page=per_page, vs_currency=vs_currency, page=1)
 
-    def norm(x: Dict[str, Any]) -> Dict[str, Any]:
-        def f(key, default=0.0):
-            try:
-                return float(x.get(key, default) or default)
-            except Exception:
-                return default
-        return {
-            "name": x.get("name") or x.get("id") or "?",
-            "symbol": (x.get("symbol") or "").upper(),
-            "current_price": f("current_price"),
-            "price_change_percentage_24h": f("price_change_percentage_24h"),
-            "id": x.get("id")
-        }
+    out: List[Dict[str, Any]] = []
+    for rows in iter_markets_pages(pages, per_page, vs_currency, concurrency, strict=strict):
+        out.extend(rows)
+    return out
 
-    rows = [norm(x) for x in rows if (x.get("current_price") or 0) not in (None, 0)]
-    gainers = sorted(rows, key=lambda r: r["price_change_percentage_24h"], reverse=True)[:top_n]
-    losers  = sorted(rows, key=lambda r: r["price_change_percentage_24h"])[:top_n]
-    return gainers, losers
+def get_coin_market(coin_id: str, vs_currency: str = "usd") -> Optional[MarketRecord]:
+    """/coins/markets row for one coin (for coins outside the scanned pages); None if unknown."""
+    params = {"vs_currency": vs_currency, "ids": coin_id, "sparkline": "false", "price_change_percentage": "24h"}
+    data = _get("/coins/markets", params, decode=decode_markets)
+    rows = from_dicts(data) if isinstance(data, list) else []
+    return rows[0] if rows else None
+
+SIMPLE_PRICE_MAX_IDS = 500  # ids per /simple/price request; keeps the URL well under server limits
+
+def get_simple_prices(ids: List[str], vs_currency: str = "usd") -> Dict[str, Dict[str, float]]:
+    """
+    Price and 24h change for many coins in one /simple/price request
+    (split only past SIMPLE_PRICE_MAX_IDS): {id: {"usd": 1.2, "usd_24h_change": -3.4}}.
+    Unknown ids are simply absent.
+    """
+    ids = sorted(set(i for i in ids if i))
+    out: Dict[str, Dict[str, float]] = {}
+    for start in range(0, len(ids), SIMPLE_PRICE_MAX_IDS):
+        params = {"ids": ",".join(ids[start:start + SIMPLE_PRICE_MAX_IDS]), "vs_currencies": vs_currency,
+                  "include_24hr_change": "true"}
+        data = _get("/simple/price", params)
+        if isinstance(data, dict):
+            out.update({k: v for k, v in data.items() if isinstance(v, dict)})
+    return out
+
+def get_coins_list() -> List[Dict[str, Any]]:
+    """Every coin CoinGecko knows: [{"id", "symbol", "name"}, ...] (~15k rows, cached for hours)."""
+    data = _get("/coins/list")
+    return data if isinstance(data, list) else []
+
+def get_exchange_rates() -> Dict[str, Dict[str, Any]]:
+    """BTC exchange rates: {"usd": {"name", "unit", "value", "type"}, "eur": {...}, "btc": {"value": 1, ...}, ...}."""
+    data = _get("/exchange_rates")
+    rates = data.get("rates") if isinstance(data, dict) else None
+    return rates if isinstance(rates, dict) else {}
+
+def get_global() -> Dict[str, Any]:
+    data = _get("/global")
+    return data if isinstance(data, dict) else {}
+
+# ----------------- per-run snapshot -----------------
+
+class MarketSnapshot:
+    """
+    One report run's view of the market: each endpoint is fetched at most once
+    and the same rows are handed to every analysis step.
+    Pass `markets` / `global_data` to seed it with data fetched elsewhere (e.g. MCP).
+    """
+
+    def __init__(self, per_page: int = 250, vs_currency: str = "usd",
+                 markets: Optional[List[Dict[str, Any]]] = None,
+                 global_data: Optional[Dict[str, Any]] = None,
+                 source: Optional[str] = None,
+                 pages: int = 1):
+        self.per_page = per_page
+        self.pages = pages
+        self.vs_currency = vs_currency
+        self._markets = markets
+        self._global = global_data
+        self._table: Optional[MarketTable] = None
+        # where the market rows came from: "mcp", "rest" or None if nothing arrived
+        self.source = source if markets is not None else None
+
+    @property
+    def markets(self) -> List[Dict[str, Any]]:
+        if self._markets is None:
+            self._markets = get_markets_pages(pages=self.pages, per_page=self.per_page,
+                                              vs_currency=self.vs_currency)
+            self.source = "rest"
+        return self._markets
+
+    @property
+    def table(self) -> MarketTable:
+        """Columnar form of `markets`, built once and shared by every analysis step."""
+        if self._table is None:
+            self._table = MarketTable.from_rows(self.markets)
+        return self._table
+
+    @property
+    def global_data(self) -> Dict[str, Any]:
+        if self._global is None:
+            self._global = get_global()
+        return self._global
+
+def get_top_gainers_losers(top_n: int = 5, per_page: int = 250, vs_currency: str = "usd",
+                           snapshot: Optional[MarketSnapshot] = None
+                           ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Top gainers / losers by 24h change; reuses `snapshot` rows when given.
+    """
+    snap = snapshot or MarketSnapshot(per_page=per_page, vs_currency=vs_currency)
+    table = snap.table
+    g_idx, l_idx = table.gainers_losers_idx(top_n)
+    return table.records(g_idx), table.records(l_idx)
 
-def get_global_change_24h() -> Optional[float]:
+def get_global_change_24h(snapshot: Optional[MarketSnapshot] = None) -> Optional[float]:
     """
-    .
+    Total market cap change over 24h, in percent.
     """
     try:
-        data = _get("/global")
+        data = (snapshot or MarketSnapshot()).global_data
         m = data.get("data", {})
         val = m.get("market_cap_change_percentage_24h_usd")
         if val is None:
@@ -3,7 +3,88 @@ import os
 
 load_dotenv()
 
+# Default data files live next to the code, so the bot and the cron run (any working directory) share them
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _data_path(name: str) -> str:
+    return os.path.join(BASE_DIR, name)
+
 CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY")
+CLAUDE_BASE_URL = os.getenv("CLAUDE_BASE_URL") or None  # e.g. a proxy or the bench/ fake; None = Anthropic API
 COINGECKO_API_KEY = os.getenv("COINGECKO_API_KEY")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
\ No newline at end of file
+TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+
+# Overall budget for one report's data collection (REST + MCP run concurrently)
+REPORT_DEADLINE_S = float(os.getenv("REPORT_DEADLINE_S", "40"))
+
+# Market pages scanned per report (250 coins each); "all" walks the whole coin list
+_scan_pages = os.getenv("SCAN_PAGES", "1").strip().lower()
+SCAN_PAGES = 0 if _scan_pages == "all" else int(_scan_pages)
+
+# Fold market pages into bounded heaps as they arrive instead of holding every row
+SCAN_STREAM = os.getenv("SCAN_STREAM", "0").strip().lower() in ("1", "true", "yes")
+
+# Local SQLite history of every report snapshot; empty string disables it
+SNAPSHOT_DB = os.getenv("SNAPSHOT_DB", _data_path("fomo_snapshots.db"))
+
+# Claude commentary cache: payloads equal after rounding reuse the last comments
+COMMENT_CACHE_TTL_S = float(os.getenv("COMMENT_CACHE_TTL_S", "900"))
+COMMENT_CACHE_SIZE = int(os.getenv("COMMENT_CACHE_SIZE", "64"))
+COMMENT_CACHE_PRECISION = int(os.getenv("COMMENT_CACHE_PRECISION", "1"))  # decimals kept for % values
+COMMENT_CACHE_DIR = os.getenv("COMMENT_CACHE_DIR")  # set to persist across runs
+
+# Progressive delivery: post the numbers first, edit in Claude's comments within this budget
+PROGRESSIVE_DELIVERY = os.getenv("PROGRESSIVE_DELIVERY", "0").strip().lower() in ("1", "true", "yes")
+COMMENT_DEADLINE_S = float(os.getenv("COMMENT_DEADLINE_S", "20"))
+
+# "api" counts prompt tokens with Anthropic's count_tokens endpoint (one extra call); default is an offline estimate
+PROMPT_TOKEN_COUNT = os.getenv("PROMPT_TOKEN_COUNT", "estimate").strip().lower()
+
+# Bot: /report serves a shared report younger than REPORT_CACHE_TTL_S; up to REPORT_STALE_S it is
+# still served while one regeneration runs in the background
+REPORT_CACHE_TTL_S = float(os.getenv("REPORT_CACHE_TTL_S", "300"))
+REPORT_STALE_S = float(os.getenv("REPORT_STALE_S", "3600"))
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "16"))
+
+# Subscribers and broadcast pacing (Telegram allows ~30 msg/s overall and ~1 msg/s per chat)
+SUBSCRIBERS_DB = os.getenv("SUBSCRIBERS_DB", _data_path("fomo_subscribers.db"))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))
+TELEGRAM_PER_CHAT_INTERVAL_S = float(os.getenv("TELEGRAM_PER_CHAT_INTERVAL_S", "1.0"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "32"))
+
+# Optional extra destinations for the daily report (incoming webhooks); empty disables
+SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL", "")
+DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL", "")
+
+# Resident scheduler (python main.py --daemon): "HH:MM [IANA zone]" slots separated by ';'
+# (no zone = machine local time); data + commentary are prepared PRECOMPUTE_LEAD_S before each slot
+SCHEDULES = os.getenv("SCHEDULES", "09:00")
+PRECOMPUTE_LEAD_S = float(os.getenv("PRECOMPUTE_LEAD_S", "120"))
+
+# Instrumentation: Prometheus /metrics on METRICS_PORT (0 = off) and/or one JSON line per span
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_TRACE_FILE = os.getenv("METRICS_TRACE_FILE", "")
+
+# Intraday alerts (python main.py --alerts): poll, diff against the previous snapshot, post only deltas
+ALERT_INTERVAL_S = float(os.getenv("ALERT_INTERVAL_S", "300"))
+ALERT_PAGES = int(os.getenv("ALERT_PAGES", "1"))                     # market pages (250 coins each) per poll
+ALERT_TOP_N = int(os.getenv("ALERT_TOP_N", "10"))                    # size of the top gainers/losers lists
+ALERT_PCT_JUMP = float(os.getenv("ALERT_PCT_JUMP", "10"))            # 24h % change moved by this many points since last poll
+ALERT_VOLUME_RATIO = float(os.getenv("ALERT_VOLUME_RATIO", "3"))     # 24h volume grew this many times since last poll
+ALERT_MIN_VOLUME = float(os.getenv("ALERT_MIN_VOLUME", "1000000"))   # ignore coins trading less than this (USD)
+ALERT_DOMINANCE_PP = float(os.getenv("ALERT_DOMINANCE_PP", "0.5"))   # BTC dominance shift (points) since last alert
+ALERT_COOLDOWN_S = float(os.getenv("ALERT_COOLDOWN_S", "3600"))      # same alert key is not posted again within this
+ALERT_MAX_PER_POST = int(os.getenv("ALERT_MAX_PER_POST", "8"))
+
+# /ask: local coin index (id / symbol / name) persisted here and rebuilt from /coins/list when older than this
+COIN_INDEX_PATH = os.getenv("COIN_INDEX_PATH", _data_path("fomo_coin_index.json"))
+COIN_INDEX_REFRESH_S = float(os.getenv("COIN_INDEX_REFRESH_S", str(24 * 3600)))
+COIN_RANK_REFRESH_S = float(os.getenv("COIN_RANK_REFRESH_S", "600"))  # re-read the market-cap rank used for ties
+ASK_SNAPSHOT_MAX_AGE_S = float(os.getenv("ASK_SNAPSHOT_MAX_AGE_S", "900"))  # answer from the last report's markets while younger
+
+# Extra report channels in other currencies, converted from the one USD report: "eur=<chat id>; btc=<chat id>"
+CURRENCY_CHATS = os.getenv("CURRENCY_CHATS", "")
+
+# Portfolio tracking (/add, /remove, /portfolio; daily summary after the report); empty string disables the daily send
+PORTFOLIO_DB = os.getenv("PORTFOLIO_DB", _data_path("fomo_portfolios.db"))
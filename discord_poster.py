@@ -0,0 +1,27 @@
+# discord_poster.py
+import time
+import requests
+from typing import List
+from config import DISCORD_WEBHOOK_URL
+from metrics import inc, span
+
+def send_discord_chunks(chunks: List[str], webhook_url: str = DISCORD_WEBHOOK_URL) -> bool:
+    """Post markdown chunks (see renderers.render_discord, 2000 chars each) to a Discord webhook."""
+    ok = True
+    for text in chunks:
+        for _ in range(3):
+            with span("discord_send"):
+                r = requests.post(webhook_url, json={"content": text, "allowed_mentions": {"parse": []}}, timeout=20)
+            if r.status_code != 429:
+                break
+            inc("retries_total", service="discord", reason="429")
+            try:
+                time.sleep(float(r.json().get("retry_after", 1)))
+            except ValueError:
+                time.sleep(1)
+        inc("messages_total", platform="discord", status=r.status_code)
+        print("📤 Discord status code:", r.status_code)
+        if r.status_code not in (200, 204):
+            print("📩 Response:", r.text)
+            ok = False
+    return ok
@@ -0,0 +1,119 @@
+# fx.py
+from __future__ import annotations
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from coingecko_client import get_exchange_rates
+from report_model import Report
+from config import CURRENCY_CHATS
+from metrics import inc
+
+# crypto units /exchange_rates knows -> report major label or coin id carrying their 24h % move
+_CRYPTO_REF = {"btc": ("BTC", "bitcoin"), "eth": ("ETH", "ethereum"), "sol": ("SOL", "solana"),
+               "bnb": ("BNB", "binancecoin"), "xrp": ("XRP", "ripple"), "ltc": ("LTC", "litecoin"),
+               "bch": ("BCH", "bitcoin-cash"), "dot": ("DOT", "polkadot"), "link": ("LINK", "chainlink"),
+               "bits": ("BTC", "bitcoin"), "sats": ("BTC", "bitcoin")}
+
+# commodity units /exchange_rates lists: today's rate only and no 24h move to re-base the report's % on
+_UNSUPPORTED = {"xau": "gold", "xag": "silver"}
+
+def parse_currency_chats(spec: str = CURRENCY_CHATS) -> Dict[str, str]:
+    """
+    'eur=-100123; btc=-100456' -> {"eur": "-100123", "btc": "-100456"}.
+    Raises ValueError for units a report cannot be converted to (commodities).
+    """
+    out = {}
+    for item in spec.replace(",", ";").split(";"):
+        unit, _, chat = item.partition("=")
+        unit = unit.strip().lower()
+        if unit in _UNSUPPORTED:
+            raise ValueError(f"CURRENCY_CHATS: {unit!r} ({_UNSUPPORTED[unit]}) is not supported, "
+                             "there is no 24h move to convert the report's changes with")
+        if unit and chat.strip():
+            out[unit] = chat.strip()
+    return out
+
+def _ref_pct(report: Report, unit: str) -> Optional[float]:
+    """24h % move of a crypto unit vs USD: from the report's majors, else the last market table."""
+    label, coin_id = _CRYPTO_REF.get(unit, (unit.upper(), ""))
+    for m in report.majors:
+        if m.label == label and m.available:
+            return m.pct
+    if coin_id:
+        from analyzer import latest_table
+        table = latest_table(24 * 3600)
+        if table is not None and coin_id in table.index:
+            return float(table.pct[table.index[coin_id]])
+    return None
+
+def _flatten(report: Report) -> Tuple[np.ndarray, np.ndarray]:
+    """Every money value and every 24h % of the report, in a fixed order (see _rebuild)."""
+    money = [report.market_cap, report.volume]
+    pct = [report.market_change_pct]
+    for m in report.majors:
+        money += [m.price, m.low, m.high, m.volume]
+        pct.append(m.pct)
+    for rows in (report.gainers, report.losers, report.strange):
+        money += [t.price for t in rows]
+        pct += [t.pct for t in rows]
+    return np.array(money, dtype=np.float64), np.array(pct, dtype=np.float64)
+
+def _rebuild(report: Report, money: List[float], pct: List[float], unit: str, kind: str) -> Report:
+    mi, pi = iter(money), iter(pct)
+    market_cap, volume, market_change = next(mi), next(mi), next(pi)
+    majors = [replace(m, price=next(mi), low=next(mi), high=next(mi), volume=next(mi), pct=next(pi))
+              for m in report.majors]
+    tokens = [[replace(t, price=next(mi), pct=next(pi)) for t in rows]
+              for rows in (report.gainers, report.losers, report.strange)]
+    return replace(report, market_cap=market_cap, volume=volume, market_change_pct=market_change,
+                   majors=majors, gainers=tokens[0], losers=tokens[1], strange=tokens[2],
+                   currency=unit, currency_kind=kind)
+
+def convert_reports(report: Report, units: List[str],
+                    rates: Optional[Dict[str, Dict[str, object]]] = None) -> Dict[str, Report]:
+    """
+    The USD report re-denominated in each of `units`, with one /exchange_rates call
+    (cached) and one vectorized pass over every value for all units at once.
+
+    Prices, caps and volumes scale by the USD->unit rate. Fiat units reuse the
+    USD 24h % (today's rate is all /exchange_rates gives, and fiat moves are small
+    next to crypto's). Crypto units get the move relative to the unit coin:
+    (1 + p) / (1 + p_unit) - 1, so BTC itself reads 0% in a BTC report. Units with
+    no known rate (or no known 24h move, for crypto) are skipped.
+    """
+    if report.currency != "usd":
+        raise ValueError("convert_reports expects the USD report")
+    rates = get_exchange_rates() if rates is None else rates
+    usd = float((rates.get("usd") or {}).get("value") or 0)
+    if usd <= 0:
+        print("No USD exchange rate, skipping currency conversion")
+        return {}
+
+    kept: List[Tuple[str, str]] = []
+    factor, ref = [], []
+    for unit in dict.fromkeys(u.lower() for u in units):
+        if unit == "usd":
+            continue
+        r = rates.get(unit) or {}
+        value, kind = float(r.get("value") or 0), str(r.get("type") or "fiat")
+        move = 0.0 if kind == "fiat" else _ref_pct(report, unit)
+        if value <= 0 or move is None:
+            why = "no exchange rate" if value <= 0 else f"no 24h move for this {kind} unit"
+            print(f"Currency {unit!r} skipped: {why}")
+            inc("currency_units_skipped_total", unit=unit)
+            continue
+        kept.append((unit, kind))
+        factor.append(value / usd)
+        ref.append(move)
+
+    out: Dict[str, Report] = {"usd": report} if "usd" in (u.lower() for u in units) else {}
+    if not kept:
+        return out
+    money, pct = _flatten(report)
+    converted = np.outer(np.array(factor), money)                                   # units x values
+    moved = ((1 + pct / 100)[None, :] / (1 + np.array(ref) / 100)[:, None] - 1) * 100
+    fiat = np.array([kind == "fiat" for _, kind in kept])
+    moved[fiat] = pct                                                                # fiat: the USD % as is
+    for (unit, kind), m, p in zip(kept, converted.tolist(), moved.tolist()):
+        out[unit] = _rebuild(report, m, p, unit, kind)
+    return out
@@ -1,13 +1,116 @@
-from claude_writer import generate_daily_report
-from telegram_poster import send_telegram_message
-from config import TELEGRAM_CHAT_ID
+import argparse
+from typing import List
+from claude_writer import generate_report, generate_progressive_report, comment_alerts
+from renderers import render_telegram, render_slack, render_discord, render_alerts
+from report_model import Alert, Report
+from telegram_poster import send_telegram_chunks, edit_telegram_chunks
+from slack_poster import send_slack_chunks
+from discord_poster import send_discord_chunks
+from broadcast import broadcast
+from subscribers import get_registry
+from config import TELEGRAM_CHAT_ID, PROGRESSIVE_DELIVERY, SLACK_WEBHOOK_URL, DISCORD_WEBHOOK_URL, CURRENCY_CHATS, PORTFOLIO_DB
 
-def run_looser_bot():
-    print("🧠 Generating report...")
-    text = generate_daily_report()
+def _deliver_others(report: Report):
+    """Render the same report for every other configured platform (no refetch, no extra Claude call)."""
+    if SLACK_WEBHOOK_URL:
+        print("📤 Send report to Slack...")
+        send_slack_chunks(render_slack(report))
+    if DISCORD_WEBHOOK_URL:
+        print("📤 Send report to Discord...")
+        send_discord_chunks(render_discord(report))
+
+def _deliver_currencies(report: Report):
+    """Same report in other currencies for CURRENCY_CHATS: one /exchange_rates call, no refetch, no Claude."""
+    if not CURRENCY_CHATS:
+        return
+    from fx import convert_reports, parse_currency_chats
+    chats = parse_currency_chats()
+    try:
+        converted = convert_reports(report, list(chats))
+    except Exception as e:
+        print("Currency conversion failed:", e)
+        return
+    for unit, r in converted.items():
+        print(f"📤 Send {unit.upper()} report to Telegram...")
+        send_telegram_chunks(render_telegram(r), chat_id=chats[unit])
+
+def _deliver_portfolios():
+    """Every tracked portfolio valued in one pass against the report's market table; one message per chat."""
+    if not PORTFOLIO_DB:
+        return
+    from portfolio import value_all
+    from renderers import render_portfolio
+    from broadcast import send_each
+    try:
+        summaries = value_all()
+    except Exception as e:
+        print("Portfolio valuation failed:", e)
+        return
+    if summaries:
+        print(f"💼 Sending {len(summaries)} portfolio summaries...")
+        send_each({chat_id: render_portfolio(p) for chat_id, p in summaries.items()})
 
+def _broadcast_subscribers(chunks):
+    if len(get_registry()):
+        print("📣 Broadcasting to subscribers...")
+        broadcast(chunks)
+
+def publish_report(report: Report):
     print("📤 Send report to Telegram...")
-    send_telegram_message(chat_id=TELEGRAM_CHAT_ID, text=text)
+    send_telegram_chunks(render_telegram(report), chat_id=TELEGRAM_CHAT_ID)
+    _deliver_others(report)
+    _deliver_currencies(report)
+    _broadcast_subscribers(render_telegram(report))
+    _deliver_portfolios()
+
+def run_looser_bot(progressive: bool = PROGRESSIVE_DELIVERY):
+    if progressive:
+        print("🧠 Generating report (numbers first, commentary follows)...")
+        report = generate_progressive_report(
+            send=lambda r: send_telegram_chunks(render_telegram(r), chat_id=TELEGRAM_CHAT_ID),
+            edit=lambda ids, r: edit_telegram_chunks(ids, render_telegram(r), chat_id=TELEGRAM_CHAT_ID),
+        )
+        _deliver_others(report)
+        _deliver_currencies(report)
+        _broadcast_subscribers(render_telegram(report))
+        _deliver_portfolios()
+        return
+
+    print("🧠 Generating report...")
+    publish_report(generate_report())
+
+def run_daemon():
+    """Stay resident and post on every slot in SCHEDULES, prepared ahead of time."""
+    from scheduler import Daemon
+    Daemon(prepare=generate_report, publish=publish_report).run()
+
+def publish_alerts(alerts: List[Alert]):
+    send_telegram_chunks(render_alerts(alerts, "telegram"), chat_id=TELEGRAM_CHAT_ID)
+    if SLACK_WEBHOOK_URL:
+        send_slack_chunks(render_alerts(alerts, "slack"))
+    if DISCORD_WEBHOOK_URL:
+        send_discord_chunks(render_alerts(alerts, "discord"))
+
+def run_alerts():
+    """Poll the market every ALERT_INTERVAL_S and post only new deltas (with Claude one-liners)."""
+    from alerts import AlertMonitor
+    AlertMonitor(publish=publish_alerts, comment=comment_alerts).run()
 
 if __name__ == "__main__":
-    run_looser_bot()
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="Post the daily crypto report.")
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--daemon", action="store_true", help="stay resident and post on SCHEDULES")
+    mode.add_argument("--alerts", action="store_true", help="poll and post intraday alerts")
+    args = ap.parse_args()
+    if CURRENCY_CHATS:
+        from fx import parse_currency_chats
+        try:
+            parse_currency_chats()  # misconfigured units fail now, not silently at delivery time
+        except ValueError as e:
+            ap.error(str(e))
+    if args.daemon:
+        run_daemon()
+    elif args.alerts:
+        run_alerts()
+    else:
+        run_looser_bot()
@@ -0,0 +1,124 @@
+# market_records.py
+from __future__ import annotations
+import json
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+# the only /coins/markets fields the analyzer reads; everything else is dropped at decode time
+FIELDS = (
+    "id", "symbol", "name",
+    "current_price", "price_change_percentage_24h", "total_volume", "market_cap", "high_24h", "low_24h",
+)
+_NUM = FIELDS[3:]
+
+def _f(v: Any) -> Optional[float]:
+    if v is None:
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+class _DictLike:
+    """Read-only mapping view over the record's fields, so code written for row dicts keeps working."""
+    __slots__ = ()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in FIELDS else default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in FIELDS
+
+    def keys(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in FIELDS}
+
+try:  # msgspec decodes straight into typed structs and skips unknown fields without materialising them
+    import msgspec
+
+    class MarketRecord(msgspec.Struct, _DictLike):
+        id: Optional[str] = None
+        symbol: Optional[str] = None
+        name: Optional[str] = None
+        current_price: Optional[float] = None
+        price_change_percentage_24h: Optional[float] = None
+        total_volume: Optional[float] = None
+        market_cap: Optional[float] = None
+        high_24h: Optional[float] = None
+        low_24h: Optional[float] = None
+
+    _decoder = msgspec.json.Decoder(List[MarketRecord])
+
+    def _typed(raw: Union[bytes, str]) -> Optional[List[MarketRecord]]:
+        try:
+            return _decoder.decode(raw)
+        except msgspec.DecodeError:  # not a bare list of rows (e.g. {"data": [...]}) or odd values
+            return None
+
+    JSON_BACKEND = "msgspec"
+except ImportError:
+    msgspec = None
+
+    class MarketRecord(_DictLike):  # type: ignore[no-redef]
+        __slots__ = FIELDS
+
+        def __init__(self, id: Optional[str] = None, symbol: Optional[str] = None, name: Optional[str] = None,
+                     current_price: Optional[float] = None, price_change_percentage_24h: Optional[float] = None,
+                     total_volume: Optional[float] = None, market_cap: Optional[float] = None,
+                     high_24h: Optional[float] = None, low_24h: Optional[float] = None):
+            self.id, self.symbol, self.name = id, symbol, name
+            self.current_price = current_price
+            self.price_change_percentage_24h = price_change_percentage_24h
+            self.total_volume, self.market_cap = total_volume, market_cap
+            self.high_24h, self.low_24h = high_24h, low_24h
+
+        def __repr__(self) -> str:
+            return f"MarketRecord({self.id!r}, {self.current_price!r})"
+
+    def _typed(raw: Union[bytes, str]) -> Optional[List[MarketRecord]]:
+        return None
+
+    JSON_BACKEND = "orjson"
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+    if JSON_BACKEND == "orjson":
+        JSON_BACKEND = "json"
+
+def loads(raw: Union[bytes, str]) -> Any:
+    """Generic JSON decode with the fastest available backend."""
+    return _loads(raw)
+
+def from_dict(row: Dict[str, Any]) -> MarketRecord:
+    g = row.get
+    return MarketRecord(g("id"), g("symbol"), g("name"), *(_f(g(k)) for k in _NUM))
+
+def from_dicts(rows: List[Dict[str, Any]]) -> List[MarketRecord]:
+    """Records from already-decoded rows (disk cache, odd MCP shapes); records pass through."""
+    return [r if isinstance(r, MarketRecord) else from_dict(r) for r in rows if isinstance(r, (dict, MarketRecord))]
+
+def decode_markets(raw: Union[bytes, str]) -> List[MarketRecord]:
+    """
+    /coins/markets JSON (a list, or {"data": [...]} from some MCP servers) -> records.
+    Numbers are floats, or None where the API sent null (like the raw JSON);
+    non-JSON or non-list payloads decode to [].
+    """
+    records = _typed(raw)
+    if records is not None:
+        return records
+    try:
+        data = _loads(raw)
+    except ValueError:
+        return []
+    if isinstance(data, dict) and isinstance(data.get("data"), list):
+        data = data["data"]
+    return from_dicts(data) if isinstance(data, list) else []
@@ -0,0 +1,153 @@
+# market_table.py
+from __future__ import annotations
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from market_records import MarketRecord
+
+# numeric columns: table attribute -> /coins/markets field
+NUM_FIELDS = {
+    "price":  "current_price",
+    "pct":    "price_change_percentage_24h",
+    "volume": "total_volume",
+    "cap":    "market_cap",
+    "high":   "high_24h",
+    "low":    "low_24h",
+}
+
+def _num_column(rows: List[Dict[str, Any]], key: str) -> np.ndarray:
+    values = [r.get(key) for r in rows]
+    try:
+        col = np.array(values, dtype=np.float64)  # None -> nan, numeric strings parse
+    except (TypeError, ValueError):
+        def f(v):
+            try:
+                return float(v)
+            except Exception:
+                return np.nan
+        col = np.fromiter((f(v) for v in values), dtype=np.float64, count=len(values))
+    return np.nan_to_num(col, nan=0.0, posinf=0.0, neginf=0.0)
+
+class MarketTable:
+    """
+    Columnar view of /coins/markets rows: float64 arrays for the numbers we use,
+    object arrays for id/symbol/name, rows kept in the order received (market cap).
+    """
+
+    __slots__ = ("ids", "symbols", "names", "price", "pct", "volume", "cap", "high", "low", "_index")
+
+    def __init__(self, ids: np.ndarray, symbols: np.ndarray, names: np.ndarray,
+                 price: np.ndarray, pct: np.ndarray, volume: np.ndarray, cap: np.ndarray,
+                 high: np.ndarray, low: np.ndarray):
+        self.ids, self.symbols, self.names = ids, symbols, names
+        self.price, self.pct, self.volume, self.cap = price, pct, volume, cap
+        self.high, self.low = high, low
+        self._index: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]]) -> "MarketTable":
+        if rows and all(isinstance(r, MarketRecord) for r in rows):
+            return cls.from_records(rows)
+        ids = np.array([r.get("id") for r in rows], dtype=object)
+        symbols = np.array([(r.get("symbol") or "").upper() for r in rows], dtype=object)
+        names = np.array([r.get("name") or r.get("id") or "?" for r in rows], dtype=object)
+        cols = {attr: _num_column(rows, key) for attr, key in NUM_FIELDS.items()}
+        return cls(ids, symbols, names, **cols)
+
+    @classmethod
+    def from_records(cls, rows: List[MarketRecord]) -> "MarketTable":
+        """Fast path for decoded records: numbers are already float or None, no per-cell coercion."""
+        ids = np.array([r.id for r in rows], dtype=object)
+        symbols = np.array([(r.symbol or "").upper() for r in rows], dtype=object)
+        names = np.array([r.name or r.id or "?" for r in rows], dtype=object)
+        cols = {attr: np.nan_to_num(np.array([getattr(r, key) for r in rows], dtype=np.float64),
+                                    nan=0.0, posinf=0.0, neginf=0.0)
+                for attr, key in NUM_FIELDS.items()}
+        return cls(ids, symbols, names, **cols)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def index(self) -> Dict[str, int]:
+        """coin id -> row position (first occurrence wins)."""
+        if self._index is None:
+            idx: Dict[str, int] = {}
+            for i, cid in enumerate(self.ids.tolist()):
+                idx.setdefault(cid, i)
+            self._index = idx
+        return self._index
+
+    # ----------------- selection -----------------
+
+    def top_idx(self, k: int, values: np.ndarray, largest: bool = True,
+                mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Row positions of the k largest (or smallest) `values`, best first; O(n) partial select."""
+        cand = np.flatnonzero(mask) if mask is not None else np.arange(len(values))
+        if k <= 0 or cand.size == 0:
+            return cand[:0]
+        v = values[cand] if largest else -values[cand]
+        if cand.size > k:
+            part = np.argpartition(-v, k - 1)[:k]
+        else:
+            part = np.arange(cand.size)
+        order = part[np.argsort(-v[part], kind="stable")]
+        return cand[order]
+
+    def priced(self) -> np.ndarray:
+        return self.price > 0
+
+    def gainers_losers_idx(self, top_n: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        mask = self.priced()
+        return (self.top_idx(top_n, self.pct, largest=True, mask=mask),
+                self.top_idx(top_n, self.pct, largest=False, mask=mask))
+
+    def move(self, global_change: Optional[float] = None, global_change_abs_lt: float = 1.0) -> np.ndarray:
+        """24h % move; taken relative to the market once the market itself moved >= global_change_abs_lt."""
+        if global_change is None or abs(global_change) < global_change_abs_lt:
+            return self.pct
+        return self.pct - global_change
+
+    def strange_idx(self, top_n: int = 5, min_abs_pct: float = 20.0,
+                    global_change: Optional[float] = None, global_change_abs_lt: float = 1.0) -> np.ndarray:
+        """Strong |24h| movers, first `top_n` in market-cap order."""
+        move = self.move(global_change, global_change_abs_lt)
+        return np.flatnonzero(np.abs(move) >= min_abs_pct)[:top_n]
+
+    # ----------------- records -----------------
+
+    def records(self, idx: np.ndarray) -> List[Dict[str, Any]]:
+        ids, names, symbols = self.ids[idx].tolist(), self.names[idx].tolist(), self.symbols[idx].tolist()
+        price, pct = self.price[idx].tolist(), self.pct[idx].tolist()
+        return [
+            {"name": n, "symbol": s, "current_price": p, "price_change_percentage_24h": c, "id": i}
+            for i, n, s, p, c in zip(ids, names, symbols, price, pct)
+        ]
+
+    def fomo(self, idx: np.ndarray, min_pct: float = 20.0, limit: int = 3) -> List[Dict[str, Any]]:
+        """'$100 in yesterday' rows for the movers in `idx` that gained >= min_pct."""
+        idx = idx[self.pct[idx] >= min_pct][:limit]
+        profit = np.round(self.pct[idx], 2).tolist()
+        final = np.round(100.0 + self.pct[idx], 2).tolist()
+        out = self.records(idx)
+        for row, p, f in zip(out, profit, final):
+            row["fomo_100_profit"] = p
+            row["fomo_100_final"] = f
+        return out
+
+    def majors(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        for cid in ids:
+            i = self.index.get(cid)
+            if i is None:
+                continue
+            out[cid] = {
+                "name": self.names[i],
+                "symbol": self.symbols[i],
+                "price": float(self.price[i]),
+                "pct_24h": float(self.pct[i]),
+                "high_24h": float(self.high[i]),
+                "low_24h": float(self.low[i]),
+                "volume_24h": float(self.volume[i]),
+                "market_cap": float(self.cap[i]),
+            }
+        return out
@@ -1,116 +1,292 @@
 # mcp_client_stdio.py
+from __future__ import annotations
 import os
 import json
+import atexit
+import shlex
+import shutil
 import asyncio
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-from typing import List, Dict, Any, Tuple
+import threading
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Union
 from config import COINGECKO_API_KEY
+from coingecko_client import _limiter, SCAN_CONCURRENCY, MAX_SCAN_PAGES
+from market_table import MarketTable
+from market_records import MarketRecord, decode_markets
+from anomaly import AnomalyEngine
+from metrics import inc, span
 
-MCP_URL = "https://mcp.pro-api.coingecko.com/sse"
+if TYPE_CHECKING:  # the mcp SDK is heavy; it is imported when the first session is opened
+    from mcp import ClientSession, StdioServerParameters
 
-async def _call_markets(per_page: int = 250, vs_currency: str = "usd") -> List[Dict[str, Any]]:
-    if not COINGECKO_API_KEY:
-        raise RuntimeError("COINGECKO_API_KEY is not set")
+MCP_URL = os.getenv("MCP_URL", "https://mcp.pro-api.coingecko.com/sse")
+# Full command line of a local stdio MCP server to use instead of mcp-remote (e.g. the bench/ fake)
+MCP_SERVER_COMMAND = os.getenv("MCP_SERVER_COMMAND", "")
+MCP_REMOTE_PACKAGE = os.getenv("MCP_REMOTE_PACKAGE", "mcp-remote@latest")
+MCP_CALL_TIMEOUT_S = float(os.getenv("MCP_CALL_TIMEOUT_S", "30"))
+
+MARKETS_TOOL_NAMES = ["get_coins_markets", "coins_markets", "markets", "get_markets"]
+
+def _server_params() -> StdioServerParameters:
+    from mcp import StdioServerParameters
 
     env = os.environ.copy()
     env.setdefault("MCP_REMOTE_NO_BROWSER", "1")
     env.setdefault("MCP_REMOTE_TRANSPORT", "sse-only")
 
-    server_params = StdioServerParameters(
-        command="npx",
-        args=["-y", "mcp-remote@latest", MCP_URL, f"--apiKey={COINGECKO_API_KEY}"],
+    if MCP_SERVER_COMMAND:
+        command, *args = shlex.split(MCP_SERVER_COMMAND)
+        return StdioServerParameters(command=command, args=args, env=env)
+
+    # A globally installed mcp-remote skips npx package resolution on every spawn
+    binary = shutil.which("mcp-remote")
+    if binary:
+        command, args = binary, []
+    else:
+        command, args = "npx", ["-y", MCP_REMOTE_PACKAGE]
+    return StdioServerParameters(
+        command=command,
+        args=args + [MCP_URL, f"--apiKey={COINGECKO_API_KEY}"],
         env=env,
     )
 
-    async with stdio_client(server_params) as (read, write):
-        async with ClientSession(read, write) as session:
-            await session.initialize()
-
-            tools = await session.list_tools()
-            items = tools.tools or []
-            # Searching tool, that will return curent market: get_coins_markets
-            wanted = next((t for t in items if t.name.lower() in [
-                "get_coins_markets", "coins_markets", "markets", "get_markets"
-            ]), None)
-            if not wanted:
-                # Fallback, will showed other markets if te scheme is different
-                raise RuntimeError(f"No markets tool found. Available: {[t.name for t in items]}")
-
-            # Most of all will understandthat ( REST /coins/markets):
-            args = {
-                "vs_currency": vs_currency,
-                "order": "market_cap_desc",
-                "per_page": per_page,   # server limit 250
-                "page": 1,
-                "sparkline": False,
-                "price_change_percentage": "24h",
-            }
-
-            res = await session.call_tool(wanted.name, args)
-            blocks = getattr(res, "content", []) or []
-            text = "\n".join([b.text for b in blocks if getattr(b, "type", "") == "text"]).strip()
+# ----------------- persistent session -----------------
+
+class MCPSessionManager:
+    """
+    Keeps one stdio MCP session warm for the whole process.
+
+    The session lives on a private event loop thread, so callers from any loop
+    (asyncio.run per report, bot handlers, ...) share it. Calls are multiplexed
+    over the same session; a dead subprocess is respawned on the next call.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._owner: Optional[asyncio.Task] = None
+        self._ready: Optional["asyncio.Future[ClientSession]"] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._session: Optional[ClientSession] = None
+        self.tool_name: Optional[str] = None  # discovered once, survives reconnects
+
+    # --- private loop ---
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._thread_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name="mcp-session", daemon=True)
+                self._thread.start()
+                self._loop = loop
+        return self._loop
+
+    def _submit(self, coro) -> "asyncio.Future[Any]":
+        fut = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        return asyncio.wrap_future(fut)
+
+    # --- session lifecycle (runs on the private loop) ---
+
+    async def _own_session(self, ready: "asyncio.Future[ClientSession]") -> None:
+        # stdio_client must be entered and exited by the same task, so one owner task holds it
+        from mcp import ClientSession
+        from mcp.client.stdio import stdio_client
+
+        try:
+            async with stdio_client(_server_params()) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    if self.tool_name is None:
+                        self.tool_name = await _discover_markets_tool(session)
+                    self._session = session
+                    if not ready.done():  # the caller that started us may have been cancelled meanwhile
+                        ready.set_result(session)
+                    await self._stop.wait()
+        except BaseException as e:
+            if not ready.done():
+                ready.set_exception(e)
+            elif not isinstance(e, asyncio.CancelledError):
+                print("MCP session died:", e)
+                inc("mcp_session_deaths_total")
+        finally:
+            self._session = None
+
+    async def _get_session(self) -> ClientSession:
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._owner is None or self._owner.done():
+                self._stop = asyncio.Event()
+                self._ready = asyncio.get_running_loop().create_future()
+                self._owner = asyncio.ensure_future(self._own_session(self._ready))
+            # shielded: a cancelled caller (deadline, REST hedge won) must not tear down a session
+            # mid-connect; the next caller picks up the same connect (or the session it opened)
+            return await asyncio.shield(self._ready)
+
+    async def _shutdown(self) -> None:
+        if self._stop is not None:
+            self._stop.set()
+        if self._owner is not None:
             try:
-                data = json.loads(text)
-                if isinstance(data, list):
-                    return data
-                # sometimes MCP can back object with field  data
-                if isinstance(data, dict) and isinstance(data.get("data"), list):
-                    return data["data"]
-                return []
-            except Exception:
-                # if return not JSON —will return empty 
-                return []
-
-def _safe_num(x, key, default=0.0):
-    try:
-        return float(x.get(key, default) or default)
-    except Exception:
-        return default
-
-def _norm_token(x: Dict[str, Any]) -> Dict[str, Any]:
-    return {
-        "name": x.get("name") or x.get("id") or "?",
-        "symbol": (x.get("symbol") or "").upper(),
-        "current_price": _safe_num(x, "current_price"),
-        "price_change_percentage_24h": _safe_num(x, "price_change_percentage_24h"),
-        "id": x.get("id"),
+                await asyncio.wait_for(self._owner, timeout=5)
+            except BaseException:
+                self._owner.cancel()
+        self._owner = None
+        self._session = None
+
+    async def _call_tool(self, args: Dict[str, Any]) -> Any:
+        if not COINGECKO_API_KEY:
+            raise RuntimeError("COINGECKO_API_KEY is not set")
+        for attempt in (1, 2):
+            session = await self._get_session()
+            try:
+                return await asyncio.wait_for(session.call_tool(self.tool_name, args), MCP_CALL_TIMEOUT_S)
+            except Exception as e:
+                if attempt == 2:
+                    raise
+                print("MCP call failed, reconnecting:", e)
+                inc("retries_total", service="mcp", reason="reconnect")
+                await self._shutdown()
+
+    # --- public API (callable from any loop) ---
+
+    async def call_markets_tool(self, args: Dict[str, Any]) -> Any:
+        return await self._submit(self._call_tool(args))
+
+    async def warm(self) -> None:
+        """Spawn and handshake ahead of time so the first report pays nothing."""
+        await self._submit(self._get_session())
+
+    def close(self) -> None:
+        if self._loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=10)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+async def _discover_markets_tool(session: ClientSession) -> str:
+    tools = await session.list_tools()
+    items = tools.tools or []
+    # Searching tool, that will return curent market: get_coins_markets
+    wanted = next((t for t in items if t.name.lower() in MARKETS_TOOL_NAMES), None)
+    if not wanted:
+        # Fallback, will showed other markets if te scheme is different
+        raise RuntimeError(f"No markets tool found. Available: {[t.name for t in items]}")
+    return wanted.name
+
+_manager: Optional[MCPSessionManager] = None
+_manager_lock = threading.Lock()
+
+def get_mcp_manager() -> MCPSessionManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = MCPSessionManager()
+            atexit.register(_manager.close)
+    return _manager
+
+async def _call_markets(per_page: int = 250, vs_currency: str = "usd", page: int = 1) -> List[MarketRecord]:
+    # MCP calls spend the same plan credits as REST, so they share its rate limiter
+    await _limiter.acquire_async()
+
+    # Most of all will understandthat ( REST /coins/markets):
+    args = {
+        "vs_currency": vs_currency,
+        "order": "market_cap_desc",
+        "per_page": per_page,   # server limit 250
+        "page": page,
+        "sparkline": False,
+        "price_change_percentage": "24h",
     }
 
-def _top_gainers_losers(markets: List[Dict[str, Any]], top_n: int = 5) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
-    rows = [_norm_token(r) for r in markets]
-    rows = [r for r in rows if r["current_price"] > 0]
-    gainers = sorted(rows, key=lambda r: r["price_change_percentage_24h"], reverse=True)[:top_n]
-    losers  = sorted(rows, key=lambda r: r["price_change_percentage_24h"])[:top_n]
-    return gainers, losers
-
-def _strange_activity(markets: List[Dict[str, Any]], global_change_abs_lt: float = 1.0, top_n: int = 5) -> List[Dict[str, Any]]:
-    # Will take strong movements |%| 
-    rows = [_norm_token(r) for r in markets]
-    rows = [r for r in rows if abs(r["price_change_percentage_24h"]) >= 20][:top_n]
-    return rows
-
-def _fomo(gainers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    fomo = []
-    for t in gainers:
-        pct = t["price_change_percentage_24h"]
-        if pct >= 20:
-            profit = 100 * (pct / 100.0)
-            fomo.append({**t, "fomo_100_profit": round(profit, 2), "fomo_100_final": round(100 + profit, 2)})
-    return fomo[:3]
+    with span("mcp_call", tool="markets"):
+        res = await get_mcp_manager().call_markets_tool(args)
+    blocks = getattr(res, "content", []) or []
+    text = "\n".join([b.text for b in blocks if getattr(b, "type", "") == "text"]).strip()
+    # a tool error (upstream 429/5xx, ...) or a non-JSON body is a failed page, not an empty one
+    if getattr(res, "isError", False):
+        inc("mcp_bad_payloads_total", reason="tool_error")
+        raise RuntimeError(f"MCP markets page {page} error: {text[:200]}")
+    if not text.startswith(("[", "{")):
+        inc("mcp_bad_payloads_total", reason="not_json")
+        raise RuntimeError(f"MCP markets page {page} returned non-JSON: {text[:200]}")
+    # a bare list of rows, or an object with field data
+    return decode_markets(text)
 
-async def fetch_mcp_summary(top_n: int = 5, per_page: int = 250) -> Dict[str, Any]:
-    markets = await _call_markets(per_page=per_page, vs_currency="usd")
-    gainers, losers = _top_gainers_losers(markets, top_n=top_n)
+def summarize_markets(markets: Union[List[Dict[str, Any]], MarketTable], top_n: int = 5,
+                      global_change: Optional[float] = None, global_change_abs_lt: float = 1.0,
+                      anomaly: Optional[AnomalyEngine] = None) -> Dict[str, Any]:
+    """
+    Run the MCP-side analysis on already fetched market rows (or their table).
+    Strange activity uses `anomaly` baselines when given, else the fixed |move| >= 20% rule;
+    moves are taken relative to the market once it moved >= global_change_abs_lt.
+    """
+    table = markets if isinstance(markets, MarketTable) else MarketTable.from_rows(markets)
+    g_idx, l_idx = table.gainers_losers_idx(top_n)
+    if anomaly is not None:
+        strange = anomaly.strange(table, top_n, global_change, global_change_abs_lt)
+    else:
+        strange = table.records(table.strange_idx(top_n, global_change=global_change,
+                                                  global_change_abs_lt=global_change_abs_lt))
     return {
-        "markets_count": len(markets),
-        "gainers": gainers,
-        "losers": losers,
-        "strange": _strange_activity(markets, top_n=top_n),
-        "fomo": _fomo(gainers),
+        "markets_count": len(table),
+        "gainers": table.records(g_idx),
+        "losers": table.records(l_idx),
+        "strange": strange,
+        "fomo": table.fomo(g_idx),
         "source": "MCP CoinGecko",
     }
 
+async def fetch_mcp_markets(per_page: int = 250, pages: int = 1,
+                            concurrency: int = SCAN_CONCURRENCY) -> List[Dict[str, Any]]:
+    """
+    Market rows over MCP; pages > 1 (or <= 0 for the whole list) are fetched
+    concurrently over the shared session. Only a successful short page ends the
+    list; if any page up to the end failed, this raises instead of returning a
+    truncated scan, so the caller falls back to REST.
+    """
+    if pages == 1:
+        return await _call_markets(per_page=per_page, vs_currency="usd")
+
+    last = pages if pages > 0 else MAX_SCAN_PAGES
+    results: Dict[int, List[Dict[str, Any]]] = {}
+    in_flight: Dict["asyncio.Task[List[Dict[str, Any]]]", int] = {}
+    failed: List[int] = []
+    next_page = 1
+    while in_flight or next_page <= last:
+        while next_page <= last and len(in_flight) < concurrency:
+            task = asyncio.ensure_future(_call_markets(per_page=per_page, vs_currency="usd", page=next_page))
+            in_flight[task] = next_page
+            next_page += 1
+        done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            page = in_flight.pop(task)
+            if task.exception() is not None:
+                print(f"MCP markets page {page} failed:", task.exception())
+                failed.append(page)
+                continue
+            rows = task.result()
+            results[page] = rows
+            if len(rows) < per_page:
+                last = min(last, page)
+
+    failed = sorted(p for p in failed if p <= last)
+    if failed:
+        inc("mcp_partial_scans_total")
+        raise RuntimeError(f"MCP markets pages {failed} failed, scan would be partial")
+    out: List[Dict[str, Any]] = []
+    for page in sorted(results):
+        if page <= last:
+            out.extend(results[page])
+    return out
+
+async def fetch_mcp_summary(top_n: int = 5, per_page: int = 250) -> Dict[str, Any]:
+    markets = await fetch_mcp_markets(per_page=per_page)
+    return summarize_markets(markets, top_n=top_n)
+
 if __name__ == "__main__":
     async def _run():
         out = await fetch_mcp_summary(top_n=5, per_page=250)
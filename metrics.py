@@ -0,0 +1,204 @@
+# metrics.py
+from __future__ import annotations
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from config import METRICS_PORT, METRICS_TRACE_FILE
+
+# latency buckets in seconds (Prometheus histogram `le` bounds)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+def _key(name: str, labels: Dict[str, Any]) -> _Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class Registry:
+    """
+    Process-wide counters and latency histograms.
+
+    Spans time a block, feed `<name>_seconds{...,status}` and, when a trace
+    file is configured, append one JSON line per finished span (with parent
+    span, so a report can be read as a tree).
+    """
+
+    def __init__(self, trace_file: str = METRICS_TRACE_FILE):
+        self._lock = threading.Lock()
+        self._counters: Dict[_Key, float] = {}
+        self._hist: Dict[_Key, List[float]] = {}  # per bucket counts + [count, sum]
+        self.trace_file = trace_file
+        self._trace = None
+        self._span_id = 0
+        self._current: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("span", default=None)
+
+    # --- counters / histograms ---
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        k = _key(name, labels)
+        with self._lock:
+            self._counters[k] = self._counters.get(k, 0.0) + value
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        k = _key(name, labels)
+        with self._lock:
+            h = self._hist.get(k)
+            if h is None:
+                h = self._hist[k] = [0.0] * (len(BUCKETS) + 2)
+            for i, le in enumerate(BUCKETS):
+                if seconds <= le:
+                    h[i] += 1
+            h[-2] += 1
+            h[-1] += seconds
+
+    def counter(self, name: str, **labels: Any) -> float:
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0.0)
+
+    # --- spans ---
+
+    @contextmanager
+    def span(self, name: str, **labels: Any) -> Iterator[Dict[str, Any]]:
+        """Time a block; the yielded dict can take extra attributes for the trace line."""
+        with self._lock:
+            self._span_id += 1
+            span_id = self._span_id
+        parent = self._current.get()
+        token = self._current.set(span_id)
+        attrs: Dict[str, Any] = {}
+        status = "ok"
+        started_wall, started = time.time(), time.perf_counter()
+        try:
+            yield attrs
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self._current.reset(token)
+            self.observe(f"{name}_seconds", elapsed, status=status, **labels)
+            if self.trace_file:
+                self._write_trace({
+                    "span": name, "id": span_id, "parent": parent, "ts": round(started_wall, 6),
+                    "duration_ms": round(elapsed * 1000, 3), "status": status,
+                    "thread": threading.current_thread().name, **labels, **attrs,
+                })
+
+    def timed(self, name: str, **labels: Any) -> Callable:
+        """Decorator form of span(), for sync and async functions."""
+        def wrap(fn: Callable) -> Callable:
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_inner(*a: Any, **kw: Any) -> Any:
+                    with self.span(name, **labels):
+                        return await fn(*a, **kw)
+                return async_inner
+
+            @functools.wraps(fn)
+            def inner(*a: Any, **kw: Any) -> Any:
+                with self.span(name, **labels):
+                    return fn(*a, **kw)
+            return inner
+        return wrap
+
+    def _write_trace(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            try:
+                if self._trace is None:
+                    self._trace = open(self.trace_file, "a", encoding="utf-8", buffering=1)
+                self._trace.write(line)
+            except OSError as e:
+                print("trace write failed:", e)
+                self.trace_file = ""
+
+    def close(self) -> None:
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+
+    # --- export ---
+
+    def render_prometheus(self) -> str:
+        def fmt(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            items = labels + extra
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            hists = sorted((k, list(v)) for k, v in self._hist.items())
+        lines: List[str] = []
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            lines.append(f"{name}{fmt(labels)} {value:g}")
+        for (name, labels), h in hists:
+            if name not in seen:
+                lines.append(f"# TYPE {name} histogram")
+                seen.add(name)
+            for le, n in zip(BUCKETS, h):
+                lines.append(f"{name}_bucket{fmt(labels, (('le', f'{le:g}'),))} {n:g}")
+            lines.append(f"{name}_bucket{fmt(labels, (('le', '+Inf'),))} {h[-2]:g}")
+            lines.append(f"{name}_count{fmt(labels)} {h[-2]:g}")
+            lines.append(f"{name}_sum{fmt(labels)} {h[-1]:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters and per-span count/sum/avg as plain data (for logs and the bench)."""
+        def name(k: _Key) -> str:
+            n, labels = k
+            return n + ("{" + ",".join(f'{a}="{v}"' for a, v in labels) + "}" if labels else "")
+
+        with self._lock:
+            counters = {name(k): v for k, v in self._counters.items()}
+            timers = {name(k): {"count": h[-2], "sum_s": h[-1], "avg_s": h[-1] / h[-2] if h[-2] else 0.0}
+                      for k, h in self._hist.items()}
+        return {"counters": counters, "timers": timers}
+
+class _Handler(BaseHTTPRequestHandler):
+    registry: Registry
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = self.registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def serve_metrics(port: int = METRICS_PORT, registry: Optional[Registry] = None) -> Optional[ThreadingHTTPServer]:
+    """Expose /metrics for Prometheus on `port` (background thread); 0 disables."""
+    if not port:
+        return None
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry or metrics})
+    server = ThreadingHTTPServer(("0.0.0.0", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"📈 Metrics on :{port}/metrics")
+    return server
+
+metrics = Registry()
+atexit.register(metrics.close)
+
+# module-level shortcuts
+span = metrics.span
+inc = metrics.inc
+timed = metrics.timed
@@ -0,0 +1,218 @@
+# portfolio.py
+from __future__ import annotations
+import math
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from coingecko_client import MarketSnapshot, get_simple_prices
+from market_table import MarketTable
+from report_model import Position, PortfolioSummary
+from metrics import inc, span
+from config import PORTFOLIO_DB
+
+_SCHEMA = """
+PRAGMA journal_mode=WAL;
+CREATE TABLE IF NOT EXISTS holdings (
+    chat_id    INTEGER NOT NULL,
+    coin_id    TEXT    NOT NULL,
+    symbol     TEXT,
+    amount     REAL    NOT NULL,
+    cost_usd   REAL,              -- total paid for `costed`; NULL when no buy price was ever given
+    costed     REAL    NOT NULL DEFAULT 0,  -- part of `amount` bought at a known price
+    updated_ts INTEGER,
+    PRIMARY KEY (chat_id, coin_id)
+) WITHOUT ROWID;
+"""
+
+@dataclass
+class Holdings:
+    """
+    Holdings rows as columns (one entry per chat/coin pair). `costs` is what was
+    paid for the `costed` part of each amount (nan when no buy price is known).
+    """
+    chat_ids: np.ndarray
+    coin_ids: np.ndarray
+    symbols: np.ndarray
+    amounts: np.ndarray
+    costs: np.ndarray
+    costed: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.chat_ids)
+
+class PortfolioStore:
+    """Per-chat coin holdings, persisted in a local SQLite file."""
+
+    def __init__(self, path: str = PORTFOLIO_DB):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        if "costed" not in [r[1] for r in self._db.execute("PRAGMA table_info(holdings)")]:
+            # files created before `costed` existed: a row with a cost was fully costed
+            with self._db:
+                self._db.execute("ALTER TABLE holdings ADD COLUMN costed REAL NOT NULL DEFAULT 0")
+                self._db.execute("UPDATE holdings SET costed = amount WHERE cost_usd IS NOT NULL")
+        self._lock = threading.Lock()
+
+    def add(self, chat_id: int, coin_id: str, symbol: str, amount: float, price: Optional[float] = None) -> None:
+        """
+        Add `amount` of a coin (bought at `price` USD each, if given) to the chat's
+        holdings. An add without a price leaves the existing cost basis as is; it
+        only grows the amount that P&L does not cover.
+        """
+        cost = amount * price if price is not None else None
+        costed = float(amount) if price is not None else 0.0
+        with self._lock, self._db:
+            self._db.execute(
+                """INSERT INTO holdings (chat_id, coin_id, symbol, amount, cost_usd, costed, updated_ts)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (chat_id, coin_id) DO UPDATE SET
+                       amount = amount + excluded.amount,
+                       cost_usd = CASE WHEN excluded.cost_usd IS NULL THEN cost_usd
+                                       ELSE COALESCE(cost_usd, 0) + excluded.cost_usd END,
+                       costed = costed + excluded.costed,
+                       symbol = excluded.symbol,
+                       updated_ts = excluded.updated_ts""",
+                (int(chat_id), coin_id, symbol, float(amount), cost, costed, int(time.time())),
+            )
+
+    def remove(self, chat_id: int, coin_id: str) -> bool:
+        with self._lock, self._db:
+            cur = self._db.execute("DELETE FROM holdings WHERE chat_id = ? AND coin_id = ?", (int(chat_id), coin_id))
+            return cur.rowcount > 0
+
+    def remove_chats(self, chat_ids: List[int]) -> None:
+        """Drop every holding of `chat_ids` (chats the bot can no longer reach)."""
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM holdings WHERE chat_id = ?", [(int(c),) for c in chat_ids])
+
+    def move_chat(self, old_chat_id: int, new_chat_id: int) -> None:
+        """Re-key a chat's holdings (a group upgraded to a supergroup gets a new chat id)."""
+        with self._lock, self._db:
+            # a coin already held under the new id keeps that row
+            self._db.execute("UPDATE OR IGNORE holdings SET chat_id = ? WHERE chat_id = ?",
+                             (int(new_chat_id), int(old_chat_id)))
+            self._db.execute("DELETE FROM holdings WHERE chat_id = ?", (int(old_chat_id),))
+
+    def load(self, chat_id: Optional[int] = None) -> Holdings:
+        """One chat's holdings, or every chat's (one query, no per-user round trips)."""
+        sql = "SELECT chat_id, coin_id, symbol, amount, cost_usd, costed FROM holdings"
+        args: tuple = ()
+        if chat_id is not None:
+            sql, args = sql + " WHERE chat_id = ?", (int(chat_id),)
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY chat_id, coin_id", args).fetchall()
+        chat_ids, coin_ids, symbols, amounts, costs, costed = zip(*rows) if rows else ((),) * 6
+        return Holdings(
+            chat_ids=np.array(chat_ids, dtype=np.int64),
+            coin_ids=np.array(coin_ids, dtype=object),
+            symbols=np.array([(s or c).upper() for s, c in zip(symbols, coin_ids)], dtype=object),
+            amounts=np.array(amounts, dtype=np.float64),
+            costs=np.array(costs, dtype=np.float64),  # NULL -> nan
+            costed=np.array(costed, dtype=np.float64),
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(DISTINCT chat_id) FROM holdings").fetchone()[0]
+
+_store: Optional[PortfolioStore] = None
+_store_lock = threading.Lock()
+
+def get_portfolio_store() -> PortfolioStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PortfolioStore()
+        return _store
+
+def _prices(coins: np.ndarray, table: Optional[MarketTable]) -> Tuple[np.ndarray, np.ndarray]:
+    """USD price and 24h % per coin: from `table` where it has the coin, the rest in one /simple/price call."""
+    price = np.zeros(len(coins), dtype=np.float64)
+    pct = np.zeros(len(coins), dtype=np.float64)
+    pos = np.full(len(coins), -1, dtype=np.int64)
+    if table is not None and len(table):
+        pos = np.fromiter((table.index.get(c, -1) for c in coins.tolist()), dtype=np.int64, count=len(coins))
+        hit = pos >= 0
+        price[hit] = table.price[pos[hit]]
+        pct[hit] = table.pct[pos[hit]]
+    missing = np.flatnonzero(pos < 0)
+    inc("portfolio_coins_total", float(len(coins) - len(missing)), source="snapshot")
+    if len(missing):
+        inc("portfolio_coins_total", float(len(missing)), source="simple_price")
+        try:
+            quotes = get_simple_prices(coins[missing].tolist())
+        except Exception as e:
+            print("Batched price lookup failed, those coins stay unpriced:", e)
+            quotes = {}
+        for i in missing.tolist():
+            q = quotes.get(coins[i]) or {}
+            price[i] = float(q.get("usd") or 0.0)
+            pct[i] = float(q.get("usd_24h_change") or 0.0)
+    return price, pct
+
+def value_portfolios(holdings: Holdings, table: Optional[MarketTable] = None) -> Dict[int, PortfolioSummary]:
+    """
+    Value every chat's holdings in one pass: each distinct coin is priced once
+    (shared `table`, then one batched /simple/price for the rest), and value,
+    24h change and P&L are computed over all rows at once, then summed per chat.
+    """
+    if not len(holdings):
+        return {}
+    with span("portfolio_valuation", rows=len(holdings)):
+        coins, coin_of = np.unique(holdings.coin_ids.astype(str), return_inverse=True)
+        price_c, pct_c = _prices(coins.astype(object), table)
+        price, pct = price_c[coin_of], pct_c[coin_of]
+
+        value = holdings.amounts * price
+        with np.errstate(divide="ignore", invalid="ignore"):
+            before = np.where(pct > -100, value / (1 + pct / 100), value)  # value 24h ago at today's amounts
+        # P&L covers only the part bought at a known price
+        has_cost = ~np.isnan(holdings.costs) & (holdings.costed > 0) & (price > 0)
+        pnl = np.where(has_cost, holdings.costed * price - np.nan_to_num(holdings.costs), 0.0)
+
+        chats, chat_of = np.unique(holdings.chat_ids, return_inverse=True)
+        n = len(chats)
+        total = np.bincount(chat_of, weights=value, minlength=n)
+        total_before = np.bincount(chat_of, weights=before, minlength=n)
+        pnl_total = np.bincount(chat_of, weights=pnl, minlength=n)
+        cost_total = np.bincount(chat_of, weights=np.where(has_cost, holdings.costs, 0.0), minlength=n)
+        costed = np.bincount(chat_of, weights=has_cost.astype(np.float64), minlength=n) > 0
+
+        # rows grouped by chat, largest position first
+        order = np.lexsort((-value, chat_of))
+        bounds = np.searchsorted(chat_of[order], np.arange(n + 1))
+        rows = list(zip(holdings.coin_ids[order].tolist(), holdings.symbols[order].tolist(),
+                        holdings.amounts[order].tolist(), price[order].tolist(), value[order].tolist(),
+                        pct[order].tolist(), np.where(has_cost, pnl, np.nan)[order].tolist()))
+
+    out: Dict[int, PortfolioSummary] = {}
+    for k, chat_id in enumerate(chats.tolist()):
+        positions = [Position(cid, sym, amt, p, v, c, None if math.isnan(pl) else pl)
+                     for cid, sym, amt, p, v, c, pl in rows[bounds[k]:bounds[k + 1]]]
+        out[chat_id] = PortfolioSummary(
+            chat_id=chat_id,
+            value=float(total[k]),
+            change_24h=float(total[k] - total_before[k]),
+            change_pct=float((total[k] / total_before[k] - 1) * 100) if total_before[k] > 0 else 0.0,
+            pnl=float(pnl_total[k]) if costed[k] else None,
+            pnl_pct=float(pnl_total[k] / cost_total[k] * 100) if costed[k] and cost_total[k] > 0 else None,
+            positions=[p for p in positions if p.price > 0],
+            unpriced=[p.coin_id for p in positions if p.price <= 0],
+        )
+    return out
+
+def value_all(table: Optional[MarketTable] = None, store: Optional[PortfolioStore] = None) -> Dict[int, PortfolioSummary]:
+    """Every chat's portfolio against `table` (default: the last report's, else page 1 of the market)."""
+    holdings = (store or get_portfolio_store()).load()
+    if not len(holdings):
+        return {}
+    if table is None:
+        from analyzer import latest_table
+        table = latest_table(3600)
+    if table is None:
+        table = MarketSnapshot().table
+    return value_portfolios(holdings, table)
@@ -0,0 +1,86 @@
+# ratelimit.py
+from __future__ import annotations
+import asyncio
+import threading
+import time
+from typing import Optional
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by sync and async callers.
+
+    `reserve()` books a token and returns how long the caller must wait for it,
+    so waiting happens outside the lock (time.sleep or asyncio.sleep).
+    The rate adapts AIMD-style: `penalize()` on a 429 halves it and honours
+    Retry-After, `reward()` after a success creeps it back to the plan limit.
+    """
+
+    def __init__(self, rate_per_s: float, burst: float = 1.0, min_rate_per_s: Optional[float] = None):
+        self.max_rate = max(1e-6, rate_per_s)
+        self.min_rate = min_rate_per_s or self.max_rate / 10
+        self.rate = self.max_rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, per_min: float, burst: float = 1.0) -> "TokenBucket":
+        return cls(per_min / 60.0, burst=burst)
+
+    @property
+    def interval(self) -> float:
+        """Current seconds per request at the sustained rate."""
+        return 1.0 / self.rate
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def reserve(self, n: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= n
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self, n: float = 1.0) -> None:
+        delay = self.reserve(n)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, n: float = 1.0) -> None:
+        delay = self.reserve(n)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def penalize(self, retry_after: Optional[float] = None) -> None:
+        """Server said slow down: halve the rate and pause everyone for `retry_after` seconds."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    def reward(self) -> None:
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    """Retry-After is either delta-seconds or an HTTP date."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return default
@@ -0,0 +1,170 @@
+# renderers.py
+from __future__ import annotations
+import html
+import math
+import re
+from typing import Callable, List
+from report_model import Alert, PortfolioSummary, Report, TokenRow, MajorRow
+
+TELEGRAM_LIMIT = 4096
+SLACK_LIMIT = 3000     # one mrkdwn text block
+DISCORD_LIMIT = 2000
+
+class _Style:
+    def __init__(self, bold: Callable[[str], str], italic: Callable[[str], str], esc: Callable[[str], str]):
+        self.bold, self.italic, self.esc = bold, italic, esc
+
+TELEGRAM = _Style(lambda s: f"<b>{s}</b>", lambda s: f"<i>{s}</i>", lambda s: html.escape(str(s), quote=False))
+SLACK = _Style(lambda s: f"*{s}*", lambda s: f"_{s}_",
+               lambda s: str(s).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;"))
+DISCORD = _Style(lambda s: f"**{s}**", lambda s: f"*{s}*", lambda s: re.sub(r"([\\*_~`|])", r"\\\1", str(s)))
+
+# ----------------- shared layout -----------------
+
+def _pct(p: float) -> str:
+    return f"{'+' if p >= 0 else ''}{p:.2f}%"
+
+_SYMBOLS = {"usd": "$", "eur": "€", "gbp": "£", "jpy": "¥", "cny": "¥", "inr": "₹", "krw": "₩", "btc": "₿", "eth": "Ξ"}
+
+def _money(v: float, r: Report, spec: str) -> str:
+    """`v` in the report's currency; non-fiat units keep 6 significant digits instead of fixed decimals."""
+    if r.currency_kind != "fiat" and "," not in spec and v:
+        spec = f".{max(0, 5 - math.floor(math.log10(abs(v))))}f"  # 6 significant digits, never 1e-05
+    sym = _SYMBOLS.get(r.currency)
+    return f"{sym}{v:{spec}}" if sym else f"{v:{spec}} {r.currency.upper()}"
+
+def _major_line(m: MajorRow, r: Report) -> str:
+    if not m.available:
+        return f"{m.label}: n/a"
+    return (
+        f"{m.label}: {_pct(m.pct)} ({_money(m.price, r, '.2f')}) "
+        f"range {_money(m.low, r, '.0f')}-{_money(m.high, r, '.0f')} vol {_money(m.volume, r, '.0f')}"
+    )
+
+def _rows(rows: List[TokenRow], r: Report, st: _Style) -> str:
+    if not rows:
+        return "—"
+    return "\n".join(f"{st.esc(t.name)} ({st.esc(t.symbol)}) | {_pct(t.pct)} | {st.esc(_money(t.price, r, '.6f'))}"
+                     for t in rows)
+
+def _notes(rows: List[TokenRow], st: _Style) -> str:
+    return "\n".join(f"• {st.esc(t.symbol)}: {st.esc(t.note)}" for t in rows if t.note)
+
+def sections(r: Report, st: _Style) -> List[str]:
+    """The report as ordered sections in one platform's markup."""
+    parts = []
+
+    # 🔥 FOMO & Takeaways (only Claude text)
+    parts.append(f"🔥 {st.bold('FOMO & Takeaways')}\n{st.esc(r.fomo)}")
+
+    # 📊 Market Overview (our numbers) + 1 comment
+    parts.append(
+        f"📊 {st.bold('Market Overview')}\n"
+        + st.esc(f"Cap {_money(r.market_cap, r, ',.0f')} | 24h {_pct(r.market_change_pct)} | "
+                 f"Vol {_money(r.volume, r, ',.0f')} | BTC dom {r.btc_dominance_pct:.2f}%")
+    )
+    if r.market_comment:
+        parts.append(st.italic(st.esc(r.market_comment)))
+
+    # 🪙 Majors + 1 comment
+    parts.append(f"🪙 {st.bold('Majors')}\n" + "\n".join(st.esc(_major_line(m, r)) for m in r.majors))
+    if r.majors_comment:
+        parts.append(st.italic(st.esc(r.majors_comment)))
+
+    # 🚀 Gainers / 💀 Losers (table + per-token bullets if present)
+    for icon, title, rows in (("🚀", "Top Gainers (24h)", r.gainers), ("💀", "Top Losers (24h)", r.losers)):
+        parts.append(f"{icon} {st.bold(title)}\n" + _rows(rows, r, st))
+        notes = _notes(rows, st)
+        if notes:
+            parts.append(notes)
+
+    # 🧐 Strange Activity (table only)
+    strange = _rows(r.strange, r, st)
+    parts.append(f"🧐 {st.bold('Strange Activity')}\n" + ("None today." if strange == "—" else strange))
+    return parts
+
+def _pack(pieces: List[str], limit: int, sep: str) -> List[str]:
+    chunks: List[str] = []
+    cur = ""
+    for p in pieces:
+        if not cur:
+            cur = p
+        elif len(cur) + len(sep) + len(p) <= limit:
+            cur += sep + p
+        else:
+            chunks.append(cur)
+            cur = p
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+def split_message(parts: List[str], limit: int, sep: str = "\n\n") -> List[str]:
+    """Pack sections into messages of at most `limit` chars, breaking only between sections
+    (then between lines of an oversized section, then hard cuts for a single oversized line)."""
+    pieces: List[str] = []
+    for p in parts:
+        if len(p) <= limit:
+            pieces.append(p)
+            continue
+        lines: List[str] = []
+        for line in p.split("\n"):
+            while len(line) > limit:
+                lines.append(line[:limit])
+                line = line[limit:]
+            lines.append(line)
+        pieces.extend(_pack(lines, limit, "\n"))
+    return _pack(pieces, limit, sep)
+
+_ALERT_ICONS = {"top_mover": "🚀", "pct_spike": "⚡", "volume_spike": "📈", "dominance_shift": "👑"}
+
+def alert_sections(alerts: List[Alert], st: _Style) -> List[str]:
+    parts = [f"🚨 {st.bold('Market alert')}"]
+    for a in alerts:
+        text = f"{_ALERT_ICONS.get(a.kind, '•')} {st.bold(st.esc(a.title))}\n{st.esc(a.detail)}"
+        if a.comment:
+            text += "\n" + st.italic(st.esc(a.comment))
+        parts.append(text)
+    return parts
+
+# ----------------- platforms -----------------
+
+def render_telegram_html(r: Report) -> str:
+    return "\n\n".join(sections(r, TELEGRAM))
+
+def render_telegram(r: Report) -> List[str]:
+    """Telegram HTML messages, each within the 4096-char limit."""
+    return split_message(sections(r, TELEGRAM), TELEGRAM_LIMIT)
+
+def render_slack(r: Report) -> List[str]:
+    return split_message(sections(r, SLACK), SLACK_LIMIT)
+
+def render_discord(r: Report) -> List[str]:
+    return split_message(sections(r, DISCORD), DISCORD_LIMIT)
+
+def render_alerts(alerts: List[Alert], platform: str = "telegram") -> List[str]:
+    st, limit = {"telegram": (TELEGRAM, TELEGRAM_LIMIT), "slack": (SLACK, SLACK_LIMIT),
+                 "discord": (DISCORD, DISCORD_LIMIT)}[platform]
+    return split_message(alert_sections(alerts, st), limit)
+
+def _usd_delta(v: float) -> str:
+    return f"{'+' if v >= 0 else '-'}${abs(v):,.2f}"
+
+def portfolio_sections(p: PortfolioSummary, st: _Style) -> List[str]:
+    head = f"💼 {st.bold('Your portfolio')}\n" + st.esc(f"${p.value:,.2f} | 24h {_pct(p.change_pct)} ({_usd_delta(p.change_24h)})")
+    if p.pnl is not None:
+        head += "\n" + st.esc(f"P&L {_usd_delta(p.pnl)}" + (f" ({_pct(p.pnl_pct)})" if p.pnl_pct is not None else ""))
+    parts = [head]
+    lines = []
+    for pos in p.positions:
+        line = f"{pos.symbol}: {pos.amount:g} × ${pos.price:,.6g} = ${pos.value:,.2f} | {_pct(pos.pct_24h)}"
+        if pos.pnl is not None:
+            line += f" | P&L {_usd_delta(pos.pnl)}"
+        lines.append(st.esc(line))
+    if lines:
+        parts.append("\n".join(lines))
+    if p.unpriced:
+        parts.append(st.italic(st.esc("No price for: " + ", ".join(p.unpriced))))
+    return parts
+
+def render_portfolio(p: PortfolioSummary) -> List[str]:
+    return split_message(portfolio_sections(p, TELEGRAM), TELEGRAM_LIMIT)
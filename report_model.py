@@ -0,0 +1,134 @@
+# report_model.py
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# majors shown in the report, in order: (coin id, label)
+MAJORS = [("bitcoin", "BTC"), ("ethereum", "ETH"), ("solana", "SOL")]
+
+@dataclass
+class TokenRow:
+    name: str
+    symbol: str
+    pct: float
+    price: float
+    note: str = ""
+
+@dataclass
+class MajorRow:
+    label: str
+    available: bool = False
+    pct: float = 0.0
+    price: float = 0.0
+    low: float = 0.0
+    high: float = 0.0
+    volume: float = 0.0
+
+@dataclass
+class Report:
+    """
+    Platform-neutral daily report: numbers plus Claude's comments, built once
+    and handed to every renderer (see renderers.py). Text fields are raw,
+    unescaped strings; empty comment means 'nothing to show'.
+    """
+    date: str
+    fomo: str
+    market_cap: float
+    volume: float
+    market_change_pct: float
+    btc_dominance_pct: float
+    market_comment: str = ""
+    majors: List[MajorRow] = field(default_factory=list)
+    majors_comment: str = ""
+    gainers: List[TokenRow] = field(default_factory=list)
+    losers: List[TokenRow] = field(default_factory=list)
+    strange: List[TokenRow] = field(default_factory=list)
+    currency: str = "usd"        # unit of every price / cap / volume above (see fx.py)
+    currency_kind: str = "fiat"  # "fiat" | "crypto", as /exchange_rates reports it
+
+def _f(x: Any) -> float:
+    try:
+        return float(x or 0.0)
+    except Exception:
+        return 0.0
+
+def _comment(x: Any) -> str:
+    x = str(x or "").strip()
+    return "" if x == "—" else x
+
+def _tokens(rows: List[Dict[str, Any]], notes: Dict[str, Any]) -> List[TokenRow]:
+    notes = {(k or "").upper(): str(v) for k, v in (notes or {}).items() if v}
+    out = []
+    for r in rows or []:
+        symbol = (r.get("symbol") or "").upper()
+        out.append(TokenRow(
+            name=str(r.get("name") or r.get("id") or "?"),
+            symbol=symbol,
+            pct=_f(r.get("pct", r.get("price_change_percentage_24h"))),
+            price=_f(r.get("price", r.get("current_price"))),
+            note=notes.get(symbol, ""),
+        ))
+    return out
+
+def build_report(payload: Dict[str, Any], comments: Dict[str, Any]) -> Report:
+    g = payload.get("global") or {}
+    m = payload.get("majors") or {}
+    majors = []
+    for cid, label in MAJORS:
+        row = m.get(cid) or {}
+        majors.append(MajorRow(
+            label=label,
+            available=bool(row),
+            pct=_f(row.get("pct_24h")),
+            price=_f(row.get("price")),
+            low=_f(row.get("low_24h")),
+            high=_f(row.get("high_24h")),
+            volume=_f(row.get("volume_24h")),
+        ))
+    return Report(
+        date=str(payload.get("date") or ""),
+        fomo=str(comments.get("fomo", "—")),
+        market_cap=_f(g.get("market_cap_usd")),
+        volume=_f(g.get("volume_usd")),
+        market_change_pct=_f(g.get("market_cap_change_24h_pct")),
+        btc_dominance_pct=_f(g.get("btc_dominance_pct")),
+        market_comment=_comment(comments.get("market_comment")),
+        majors=majors,
+        majors_comment=_comment(comments.get("majors_comment")),
+        gainers=_tokens(payload.get("gainers"), comments.get("gainers_notes")),
+        losers=_tokens(payload.get("losers"), comments.get("losers_notes")),
+        strange=_tokens(payload.get("strange"), {}),
+    )
+
+@dataclass
+class Alert:
+    """One intraday delta worth posting (see alerts.py); `key` identifies it for dedup/cooldown."""
+    kind: str          # "top_mover" | "pct_spike" | "volume_spike" | "dominance_shift"
+    key: str
+    title: str         # e.g. coin "Name (SYM)" or "BTC dominance"
+    detail: str        # the numbers, already formatted
+    magnitude: float   # for ranking when there are more alerts than fit in one post
+    coin_id: str = ""
+    comment: str = ""  # Claude's one-liner, if any
+
+@dataclass
+class Position:
+    coin_id: str
+    symbol: str
+    amount: float
+    price: float        # USD; 0 when no price was found
+    value: float
+    pct_24h: float
+    pnl: Optional[float] = None  # None when no buy price was given
+
+@dataclass
+class PortfolioSummary:
+    """One user's holdings valued at the shared snapshot's prices (see portfolio.py)."""
+    chat_id: int
+    value: float
+    change_24h: float
+    change_pct: float
+    pnl: Optional[float] = None
+    pnl_pct: Optional[float] = None
+    positions: List[Position] = field(default_factory=list)  # largest first
+    unpriced: List[str] = field(default_factory=list)        # coin ids without a price
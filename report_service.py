@@ -0,0 +1,56 @@
+# report_service.py
+from __future__ import annotations
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+from config import REPORT_CACHE_TTL_S, REPORT_STALE_S
+
+class ReportCache:
+    """
+    The latest generated report (rendered message chunks), shared by every bot handler.
+
+    - fresh (younger than `max_age`): returned immediately;
+    - stale but younger than `stale_ok`: returned immediately, and one
+      background regeneration is started;
+    - missing or too old: callers wait for the regeneration.
+    However many handlers ask at once, only one generation runs (single-flight).
+    """
+
+    def __init__(self, generate: Callable[[], List[str]], max_age: float = REPORT_CACHE_TTL_S,
+                 stale_ok: float = REPORT_STALE_S):
+        self.generate = generate
+        self.max_age = max_age
+        self.stale_ok = max(stale_ok, max_age)
+        self._chunks: Optional[List[str]] = None
+        self._ts = 0.0
+        self._lock = threading.Lock()
+        self._building: Optional["Future[List[str]]"] = None
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-gen")
+
+    @property
+    def age(self) -> float:
+        return time.time() - self._ts if self._chunks is not None else float("inf")
+
+    def _build(self) -> List[str]:
+        chunks = self.generate()
+        with self._lock:
+            self._chunks, self._ts = chunks, time.time()
+        return chunks
+
+    def refresh(self) -> "Future[List[str]]":
+        """Start a regeneration unless one is already running; returns its future."""
+        with self._lock:
+            if self._building is None or self._building.done():
+                self._building = self._pool.submit(self._build)
+            return self._building
+
+    def get(self, timeout: Optional[float] = None) -> List[str]:
+        with self._lock:
+            chunks, age = self._chunks, self.age
+        if chunks is not None and age < self.max_age:
+            return chunks
+        fut = self.refresh()
+        if chunks is not None and age < self.stale_ok:
+            return chunks  # stale-while-revalidate
+        return fut.result(timeout=timeout)
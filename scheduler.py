@@ -0,0 +1,149 @@
+# scheduler.py
+from __future__ import annotations
+import asyncio
+import datetime as dt
+import signal
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from config import SCHEDULES, PRECOMPUTE_LEAD_S
+from metrics import inc, serve_metrics
+
+@dataclass(frozen=True)
+class Schedule:
+    """A daily post time, wall clock in `tz` (None = the machine's local zone)."""
+    hour: int
+    minute: int
+    tz: Optional[str] = None
+
+    def next_run(self, after: dt.datetime) -> dt.datetime:
+        """First occurrence strictly after `after` (aware), as an aware datetime."""
+        clock = dt.time(self.hour, self.minute)
+        if self.tz:
+            zone = ZoneInfo(self.tz)
+            day = after.astimezone(zone).date()
+
+            def at(d: dt.date) -> dt.datetime:
+                # round-trip through UTC so a slot inside a DST gap lands on a real instant
+                return dt.datetime.combine(d, clock, tzinfo=zone).astimezone(dt.timezone.utc).astimezone(zone)
+        else:
+            day = after.astimezone().date()
+
+            def at(d: dt.date) -> dt.datetime:
+                # machine local time: localize each candidate day on its own, so the offset
+                # is that day's (not today's) and 09:00 stays 09:00 across a DST change
+                return dt.datetime.combine(d, clock).astimezone()
+
+        for _ in range(3):
+            run = at(day)
+            if run > after:
+                return run
+            day += dt.timedelta(days=1)
+        raise RuntimeError(f"no next run for {self}")
+
+    def __str__(self) -> str:
+        return f"{self.hour:02d}:{self.minute:02d} {self.tz or 'local'}"
+
+def parse_schedules(spec: str = SCHEDULES) -> List[Schedule]:
+    """'09:00 Europe/Kyiv; 18:30 America/New_York; 12:00' -> schedules (zone optional)."""
+    out = []
+    for item in spec.replace(",", ";").split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        clock, _, tz = item.partition(" ")
+        hh, _, mm = clock.partition(":")
+        tz = tz.strip() or None
+        if tz:
+            ZoneInfo(tz)  # fail at startup on a typo, not at post time
+        out.append(Schedule(int(hh), int(mm or 0), tz))
+    if not out:
+        raise ValueError(f"no schedules in {spec!r}")
+    return out
+
+def next_slot(schedules: List[Schedule], after: dt.datetime) -> Tuple[dt.datetime, List[Schedule]]:
+    """Earliest upcoming instant and every schedule that falls on it (same instant posts once)."""
+    runs = [(s.next_run(after), s) for s in schedules]
+    first = min(at for at, _ in runs)
+    return first, [s for at, s in runs if at == first]
+
+def _warm() -> None:
+    """Open the MCP session ahead of the first slot; REST reuses its pooled keep-alive session."""
+    try:
+        from mcp_client_stdio import get_mcp_manager
+        asyncio.run(get_mcp_manager().warm())
+        print("🔥 MCP session warm")
+    except Exception as e:
+        print("MCP warm-up failed (REST fallback still available):", e)
+
+class Daemon:
+    """
+    Stays resident and posts on every schedule slot.
+
+    `prepare()` (data fetch + Claude) starts PRECOMPUTE_LEAD_S before the slot;
+    its result is held until the slot and handed to `publish()` on time. If
+    preparation overruns, the post goes out as soon as it is ready.
+    """
+
+    def __init__(self, prepare: Callable[[], Any], publish: Callable[[Any], Any],
+                 schedules: Optional[List[Schedule]] = None, lead_s: float = PRECOMPUTE_LEAD_S,
+                 warm: Callable[[], None] = _warm):
+        self.prepare = prepare
+        self.publish = publish
+        self.schedules = schedules or parse_schedules()
+        self.lead_s = max(0.0, lead_s)
+        self.warm = warm
+        self._stop = threading.Event()
+
+    def stop(self, *_: Any) -> None:
+        self._stop.set()
+
+    def _sleep_until(self, when: dt.datetime) -> bool:
+        """Wall-clock sleep in short steps (survives suspend/clock jumps); False if stopped."""
+        while not self._stop.is_set():
+            left = (when - dt.datetime.now(dt.timezone.utc)).total_seconds()
+            if left <= 0:
+                return True
+            self._stop.wait(min(left, 30.0))
+        return False
+
+    def run_once(self, slot: dt.datetime) -> None:
+        if not self._sleep_until(slot - dt.timedelta(seconds=self.lead_s)):
+            return
+        started = time.monotonic()
+        try:
+            result = self.prepare()
+        except Exception as e:
+            print(f"⚠️ Preparing the {slot:%H:%M %Z} report failed:", e)
+            return
+        print(f"🧮 Report for {slot:%Y-%m-%d %H:%M %Z} ready in {time.monotonic() - started:.1f}s")
+        if not self._sleep_until(slot):
+            return
+        late = (dt.datetime.now(dt.timezone.utc) - slot).total_seconds()
+        if late > 1:
+            print(f"⏰ Posting {late:.0f}s late (raise PRECOMPUTE_LEAD_S)")
+            inc("late_posts_total")
+        try:
+            self.publish(result)
+        except Exception as e:
+            print("⚠️ Publishing failed:", e)
+
+    def run(self) -> None:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                signal.signal(sig, self.stop)
+            except ValueError:  # not the main thread
+                pass
+        serve_metrics()
+        print("🗓 Schedules:", ", ".join(map(str, self.schedules)), f"(precompute {self.lead_s:.0f}s ahead)")
+        self.warm()
+        after = dt.datetime.now(dt.timezone.utc)
+        while not self._stop.is_set():
+            # a slot closer than the lead time is still taken, just prepared late
+            slot, due = next_slot(self.schedules, after)
+            print(f"⏳ Next post {slot:%Y-%m-%d %H:%M %Z} ({', '.join(map(str, due))})")
+            self.run_once(slot)
+            after = slot
+        print("👋 Scheduler stopped")
@@ -0,0 +1,18 @@
+# slack_poster.py
+import requests
+from typing import List
+from config import SLACK_WEBHOOK_URL
+from metrics import inc, span
+
+def send_slack_chunks(chunks: List[str], webhook_url: str = SLACK_WEBHOOK_URL) -> bool:
+    """Post mrkdwn chunks (see renderers.render_slack) to a Slack incoming webhook."""
+    ok = True
+    for text in chunks:
+        with span("slack_send"):
+            r = requests.post(webhook_url, json={"text": text, "mrkdwn": True}, timeout=20)
+        inc("messages_total", platform="slack", status=r.status_code)
+        print("📤 Slack status code:", r.status_code)
+        if r.status_code != 200:
+            print("📩 Response:", r.text)
+            ok = False
+    return ok
@@ -0,0 +1,184 @@
+# snapshot_store.py
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from market_table import MarketTable, NUM_FIELDS
+
+# column order shared by inserts and reads (table attribute == db column)
+_NUM_COLS = list(NUM_FIELDS)
+
+_SCHEMA = f"""
+PRAGMA journal_mode=WAL;
+CREATE TABLE IF NOT EXISTS snapshots (
+    ts          INTEGER PRIMARY KEY,
+    source      TEXT,
+    coins       INTEGER,
+    global_json TEXT
+);
+CREATE TABLE IF NOT EXISTS coins (
+    coin_id TEXT PRIMARY KEY,
+    symbol  TEXT,
+    name    TEXT
+);
+CREATE TABLE IF NOT EXISTS coin_snapshots (
+    coin_id TEXT    NOT NULL,
+    ts      INTEGER NOT NULL,
+    {", ".join(f"{c} REAL" for c in _NUM_COLS)},
+    PRIMARY KEY (coin_id, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS coin_snapshots_ts ON coin_snapshots (ts, coin_id);
+CREATE TABLE IF NOT EXISTS baselines (
+    coin_id   TEXT PRIMARY KEY,
+    n         INTEGER,
+    ts        INTEGER,
+    move_mean REAL,
+    move_var  REAL,
+    lvol_mean REAL,
+    lvol_var  REAL
+) WITHOUT ROWID;
+"""
+
+# (n, ts, move_mean, move_var, lvol_mean, lvol_var) per coin, see anomaly.py
+Baseline = Tuple[int, int, float, float, float, float]
+
+class SnapshotStore:
+    """
+    Append-only SQLite history of market snapshots.
+
+    coin_snapshots is keyed (coin_id, ts), so one coin's history is a single
+    range scan; the (ts, coin_id) index serves a time slice across all coins.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    # ----------------- writes -----------------
+
+    def append(self, table: MarketTable, global_data: Optional[Dict[str, Any]] = None,
+               ts: Optional[int] = None, source: Optional[str] = None) -> int:
+        """
+        Store one snapshot (or one page of it: repeated calls with the same `ts`
+        add to the same snapshot). Rows already present for (coin, ts) are kept.
+        """
+        ts = int(ts if ts is not None else time.time())
+        ids = table.ids.tolist()
+        cols = [getattr(table, c).tolist() for c in _NUM_COLS]
+        rows = [(cid, ts, *vals) for cid, *vals in zip(ids, *cols) if cid]
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO snapshots (ts, source, coins, global_json) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (ts) DO UPDATE SET coins = coins + excluded.coins, "
+                "source = COALESCE(excluded.source, source), "
+                "global_json = COALESCE(excluded.global_json, global_json)",
+                (ts, source, len(rows), json.dumps(global_data) if global_data else None),
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO coins (coin_id, symbol, name) VALUES (?, ?, ?)",
+                [(cid, s, n) for cid, s, n in zip(ids, table.symbols.tolist(), table.names.tolist()) if cid],
+            )
+            self._db.executemany(
+                f"INSERT OR IGNORE INTO coin_snapshots (coin_id, ts, {', '.join(_NUM_COLS)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(_NUM_COLS))})",
+                rows,
+            )
+        return ts
+
+    # ----------------- reads -----------------
+
+    def timestamps(self, since: Optional[int] = None, until: Optional[int] = None) -> List[int]:
+        with self._lock:
+            cur = self._db.execute(
+                "SELECT ts FROM snapshots WHERE ts >= ? AND ts <= ? ORDER BY ts",
+                (since or 0, until if until is not None else 2**62),
+            )
+            return [r[0] for r in cur]
+
+    def latest_ts(self, before: Optional[int] = None) -> Optional[int]:
+        """Most recent snapshot at or before `before` (default: now)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MAX(ts) FROM snapshots WHERE ts <= ?",
+                (before if before is not None else 2**62,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def coin_history(self, coin_id: str, since: Optional[int] = None,
+                     until: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """One coin over a time range as columns: {"ts": int64[], "price": float64[], ...}."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT ts, {', '.join(_NUM_COLS)} FROM coin_snapshots "
+                "WHERE coin_id = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                (coin_id, since or 0, until if until is not None else 2**62),
+            ).fetchall()
+        arr = np.array(rows, dtype=np.float64).reshape(len(rows), len(_NUM_COLS) + 1)
+        out = {"ts": arr[:, 0].astype(np.int64)}
+        for j, c in enumerate(_NUM_COLS, start=1):
+            out[c] = arr[:, j]
+        return out
+
+    def slice_at(self, ts: int) -> MarketTable:
+        """Every coin in the snapshot taken at `ts`, as a MarketTable (market-cap order)."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT s.coin_id, c.symbol, c.name, {', '.join('s.' + c for c in _NUM_COLS)} "
+                "FROM coin_snapshots s LEFT JOIN coins c ON c.coin_id = s.coin_id "
+                "WHERE s.ts = ? ORDER BY s.cap DESC",
+                (ts,),
+            ).fetchall()
+        ids = np.array([r[0] for r in rows], dtype=object)
+        symbols = np.array([r[1] or "" for r in rows], dtype=object)
+        names = np.array([r[2] or r[0] for r in rows], dtype=object)
+        nums = np.array([r[3:] for r in rows], dtype=np.float64).reshape(len(rows), len(_NUM_COLS))
+        return MarketTable(ids, symbols, names, **{c: nums[:, j].copy() for j, c in enumerate(_NUM_COLS)})
+
+    def cap_rank(self) -> Dict[str, int]:
+        """coin id -> market-cap position in the latest snapshot that has coins ({} when there is none)."""
+        with self._lock:
+            cur = self._db.execute(
+                "SELECT coin_id FROM coin_snapshots "
+                "WHERE ts = (SELECT MAX(ts) FROM snapshots WHERE coins > 0) ORDER BY cap DESC")
+            return {r[0]: i for i, r in enumerate(cur)}
+
+    def global_at(self, ts: int) -> Dict[str, Any]:
+        with self._lock:
+            row = self._db.execute("SELECT global_json FROM snapshots WHERE ts = ?", (ts,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else {}
+
+    # ----------------- rolling baselines -----------------
+
+    def load_baselines(self) -> Dict[str, Baseline]:
+        with self._lock:
+            cur = self._db.execute(
+                "SELECT coin_id, n, ts, move_mean, move_var, lvol_mean, lvol_var FROM baselines")
+            return {r[0]: tuple(r[1:]) for r in cur}
+
+    def save_baselines(self, rows: Dict[str, Baseline]) -> None:
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO baselines "
+                "(coin_id, n, ts, move_mean, move_var, lvol_mean, lvol_var) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(cid, *b) for cid, b in rows.items()],
+            )
+
+_store: Optional[SnapshotStore] = None
+_store_lock = threading.Lock()
+
+def get_store(path: str) -> SnapshotStore:
+    """Process-wide store for `path` (opened on first use)."""
+    global _store
+    with _store_lock:
+        if _store is None or _store.path != path:
+            _store = SnapshotStore(path)
+    return _store
@@ -0,0 +1,59 @@
+# startup_profile.py
+"""
+Import-time profile of an entry point (python -X importtime), checked against a budget.
+
+    python startup_profile.py                 # profiles `main`
+    python startup_profile.py bot_listener --top 25
+
+Exits 1 when the import takes longer than STARTUP_BUDGET_MS, or when a module
+that should load lazily (Anthropic / MCP SDKs) is imported up front.
+"""
+from __future__ import annotations
+import argparse
+import os
+import subprocess
+import sys
+from typing import List, Tuple
+
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "600"))
+LAZY_MODULES = ("anthropic", "mcp")  # only imported when a report actually calls them
+
+def profile(module: str) -> List[Tuple[str, int, int]]:
+    """(module, self_us, cumulative_us) for every import, in import order."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"import {module} failed")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cum_us)))
+    return rows
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("module", nargs="?", default="main")
+    ap.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    ap.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    args = ap.parse_args()
+
+    rows = profile(args.module)
+    total_ms = next((cum for name, _, cum in rows if name == args.module), 0) / 1000
+
+    print(f"{'cumulative':>12} {'self':>9}  module")
+    for name, self_us, cum_us in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"{cum_us / 1000:10.1f}ms {self_us / 1000:7.1f}ms  {name}")
+
+    eager = sorted({n.split(".")[0] for n, _, _ in rows if n.split(".")[0] in LAZY_MODULES})
+    ok = total_ms <= args.budget_ms and not eager
+    print(f"\nimport {args.module}: {total_ms:.0f}ms (budget {args.budget_ms:.0f}ms)"
+          + (f", eagerly imported: {', '.join(eager)}" if eager else "")
+          + (" ✅" if ok else " ❌"))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
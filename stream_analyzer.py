@@ -0,0 +1,133 @@
+# stream_analyzer.py
+from __future__ import annotations
+import heapq
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union
+from market_table import MarketTable
+from anomaly import AnomalyEngine
+
+MAJOR_IDS = ("bitcoin", "ethereum", "solana")
+
+class StreamingAnalyzer:
+    """
+    Consumes /coins/markets pages one at a time and keeps only bounded state:
+    top-K gainers/losers heaps, the first K strange movers, majors and running
+    aggregates. Memory does not grow with the number of pages scanned.
+
+    With an AnomalyEngine, strange activity is a top-K heap by anomaly score and
+    each page also updates the engine's baselines; without one it is the first
+    K coins with |24h| >= strange_min_abs_pct.
+
+    `global_change` (the market's 24h % from /global) is applied exactly as in
+    snapshot mode, so strange activity and the baselines shared with it are
+    market-relative once the market moved >= `global_change_abs_lt`.
+
+    Pages must arrive in market-cap order (as iter_markets_pages yields them).
+    `feed` and `result` are thread-safe, so a deadline can read partial results
+    while a scan is still running.
+    """
+
+    def __init__(self, top_n: int = 5, strange_min_abs_pct: float = 20.0,
+                 major_ids: Iterable[str] = MAJOR_IDS, anomaly: Optional[AnomalyEngine] = None,
+                 ts: Optional[int] = None, global_change: Optional[float] = None,
+                 global_change_abs_lt: float = 1.0):
+        self.top_n = top_n
+        self.global_change = global_change
+        self.global_change_abs_lt = global_change_abs_lt
+        self.anomaly = anomaly
+        self.ts = ts
+        self.strange_min_abs_pct = strange_min_abs_pct
+        self.major_ids = tuple(major_ids)
+        # min-heaps of (key, -seq, record): the root is the weakest kept entry,
+        # and on equal keys the later row is evicted first (stable like sorted())
+        self._gainers: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._losers: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._strange: List[Dict[str, Any]] = []
+        self._anomalies: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._majors: Dict[str, Dict[str, Any]] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.count = 0
+        self.advancers = 0
+        self.decliners = 0
+        self.cap_sum = 0.0
+        self.volume_sum = 0.0
+        self._cap_pct_sum = 0.0  # sum(cap * pct), for the cap-weighted 24h change
+
+    def _push(self, heap: List[Tuple[float, int, Dict[str, Any]]], key: float, seq: int,
+              rec: Dict[str, Any]) -> None:
+        item = (key, -seq, rec)
+        if len(heap) < self.top_n:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+
+    def feed(self, rows: Union[List[Dict[str, Any]], MarketTable]) -> None:
+        # per-page work is vectorized; only the page's own top-K reach the heaps
+        table = rows if isinstance(rows, MarketTable) else MarketTable.from_rows(rows)
+        g_idx, l_idx = table.gainers_losers_idx(self.top_n)
+        if self.anomaly is not None:
+            strange_idx, scores = self.anomaly.strange_idx(table, top_n=self.top_n, global_change=self.global_change,
+                                                           global_change_abs_lt=self.global_change_abs_lt)
+            anomalies = self.anomaly.records(table, strange_idx, scores)
+            ranks = scores["rank"][strange_idx].tolist()
+            self.anomaly.update(table, ts=self.ts, global_change=self.global_change,
+                                global_change_abs_lt=self.global_change_abs_lt)
+        else:
+            strange_idx = table.strange_idx(top_n=self.top_n, min_abs_pct=self.strange_min_abs_pct,
+                                            global_change=self.global_change,
+                                            global_change_abs_lt=self.global_change_abs_lt)
+        majors = table.majors(list(self.major_ids))
+        with self._lock:
+            base = self._seq
+            for i, rec in zip(g_idx.tolist(), table.records(g_idx)):
+                self._push(self._gainers, rec["price_change_percentage_24h"], base + i, rec)
+            for i, rec in zip(l_idx.tolist(), table.records(l_idx)):
+                self._push(self._losers, -rec["price_change_percentage_24h"], base + i, rec)
+            if self.anomaly is not None:
+                for i, rank, rec in zip(strange_idx.tolist(), ranks, anomalies):
+                    self._push(self._anomalies, rank, base + i, rec)
+            elif len(self._strange) < self.top_n:
+                self._strange.extend(table.records(strange_idx)[: self.top_n - len(self._strange)])
+            for cid, row in majors.items():
+                self._majors.setdefault(cid, row)
+
+            self._seq += len(table)
+            self.pages += 1
+            self.count += len(table)
+            self.advancers += int((table.pct > 0).sum())
+            self.decliners += int((table.pct < 0).sum())
+            self.cap_sum += float(table.cap.sum())
+            self.volume_sum += float(table.volume.sum())
+            self._cap_pct_sum += float((table.cap * table.pct).sum())
+
+    def result(self) -> Dict[str, Any]:
+        """Same shape as mcp_client_stdio.summarize_markets, plus majors and aggregates."""
+        with self._lock:
+            gainers = [rec for _, _, rec in sorted(self._gainers, reverse=True)]
+            losers = [rec for _, _, rec in sorted(self._losers, reverse=True)]
+            fomo = []
+            for rec in gainers:
+                pct = rec["price_change_percentage_24h"]
+                if pct >= 20 and len(fomo) < 3:
+                    fomo.append({**rec, "fomo_100_profit": round(pct, 2), "fomo_100_final": round(100 + pct, 2)})
+            return {
+                "markets_count": self.count,
+                "gainers": gainers,
+                "losers": losers,
+                "strange": ([rec for _, _, rec in sorted(self._anomalies, reverse=True)]
+                            if self.anomaly is not None else list(self._strange)),
+                "fomo": fomo,
+                "majors": dict(self._majors),
+                "aggregates": {
+                    "pages": self.pages,
+                    "coins": self.count,
+                    "advancers": self.advancers,
+                    "decliners": self.decliners,
+                    "market_cap_usd": self.cap_sum,
+                    "volume_usd": self.volume_sum,
+                    "cap_weighted_change_24h_pct": (self._cap_pct_sum / self.cap_sum) if self.cap_sum else 0.0,
+                },
+                "source": "stream",
+            }
@@ -0,0 +1,71 @@
+# subscribers.py
+from __future__ import annotations
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+from config import SUBSCRIBERS_DB
+
+_SCHEMA = """
+PRAGMA journal_mode=WAL;
+CREATE TABLE IF NOT EXISTS subscribers (
+    chat_id    INTEGER PRIMARY KEY,
+    name       TEXT,
+    created_ts INTEGER
+);
+"""
+
+class SubscriberRegistry:
+    """Chats that receive the daily report, persisted in a local SQLite file."""
+
+    def __init__(self, path: str = SUBSCRIBERS_DB):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def add(self, chat_id: int, name: Optional[str] = None) -> bool:
+        """Returns True if the chat was not subscribed yet."""
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO subscribers (chat_id, name, created_ts) VALUES (?, ?, ?)",
+                (int(chat_id), name, int(time.time())),
+            )
+            return cur.rowcount > 0
+
+    def remove(self, chat_id: int) -> bool:
+        with self._lock, self._db:
+            cur = self._db.execute("DELETE FROM subscribers WHERE chat_id = ?", (int(chat_id),))
+            return cur.rowcount > 0
+
+    def move(self, old_chat_id: int, new_chat_id: int) -> None:
+        """Re-key a subscription (a group upgraded to a supergroup gets a new chat id)."""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO subscribers (chat_id, name, created_ts) "
+                "SELECT ?, name, created_ts FROM subscribers WHERE chat_id = ?",
+                (int(new_chat_id), int(old_chat_id)),
+            )
+            self._db.execute("DELETE FROM subscribers WHERE chat_id = ?", (int(old_chat_id),))
+
+    def remove_many(self, chat_ids: List[int]) -> None:
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM subscribers WHERE chat_id = ?", [(int(c),) for c in chat_ids])
+
+    def chat_ids(self) -> List[int]:
+        with self._lock:
+            return [r[0] for r in self._db.execute("SELECT chat_id FROM subscribers ORDER BY chat_id")]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM subscribers").fetchone()[0]
+
+_registry: Optional[SubscriberRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> SubscriberRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = SubscriberRegistry()
+    return _registry
@@ -1,19 +1,68 @@
 # telegram_poster.py
 import os, requests, html
+from typing import List, Optional
 from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+from metrics import inc, span
 
-API = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}"
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+API = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}"
 
 def _escape(s: str) -> str:
     return html.escape(str(s), quote=False)
 
-def send_telegram_message(text: str, chat_id: str = TELEGRAM_CHAT_ID):
+def send_telegram_message(text: str, chat_id: str = TELEGRAM_CHAT_ID) -> Optional[int]:
+    """Post `text` (HTML); returns the message_id so the post can be edited later."""
     payload = {
         "chat_id": chat_id,
         "text": text,
         "parse_mode": "HTML",
         "disable_web_page_preview": True,
     }
-    r = requests.post(f"{API}/sendMessage", json=payload, timeout=20)
+    with span("telegram_send", method="sendMessage") as s:
+        r = requests.post(f"{API}/sendMessage", json=payload, timeout=20)
+        s["http_status"] = r.status_code
+    inc("messages_total", platform="telegram", status=r.status_code)
     print("📤 Status code:", r.status_code)
     print("📩 Response:", r.text)
+    try:
+        return r.json()["result"]["message_id"]
+    except Exception:
+        return None
+
+def edit_telegram_message(message_id: int, text: str, chat_id: str = TELEGRAM_CHAT_ID):
+    payload = {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "text": text,
+        "parse_mode": "HTML",
+        "disable_web_page_preview": True,
+    }
+    with span("telegram_send", method="editMessageText") as s:
+        r = requests.post(f"{API}/editMessageText", json=payload, timeout=20)
+        s["http_status"] = r.status_code
+    print("✏️ Edit status code:", r.status_code)
+    if r.status_code != 200:
+        print("📩 Response:", r.text)
+
+def delete_telegram_message(message_id: int, chat_id: str = TELEGRAM_CHAT_ID):
+    r = requests.post(f"{API}/deleteMessage", json={"chat_id": chat_id, "message_id": message_id}, timeout=20)
+    if r.status_code != 200:
+        print("📩 Delete response:", r.text)
+
+def send_telegram_chunks(chunks: List[str], chat_id: str = TELEGRAM_CHAT_ID) -> List[Optional[int]]:
+    """Post a report already split at the 4096-char limit; returns one message_id per chunk."""
+    return [send_telegram_message(text, chat_id=chat_id) for text in chunks]
+
+def edit_telegram_chunks(message_ids: List[Optional[int]], chunks: List[str], chat_id: str = TELEGRAM_CHAT_ID) -> List[Optional[int]]:
+    """Replace a posted multi-message report: edit in place, send any extra chunks, delete leftovers."""
+    ids = []
+    for i, text in enumerate(chunks):
+        if i < len(message_ids) and message_ids[i] is not None:
+            edit_telegram_message(message_ids[i], text, chat_id=chat_id)
+            ids.append(message_ids[i])
+        else:
+            ids.append(send_telegram_message(text, chat_id=chat_id))
+    for message_id in message_ids[len(chunks):]:
+        if message_id is not None:
+            delete_telegram_message(message_id, chat_id=chat_id)
+    return ids
@@ -0,0 +1,106 @@
+# ttl_cache.py
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+def _to_json(o: Any) -> Any:
+    # typed records (market_records.MarketRecord) are stored as plain dicts
+    if hasattr(o, "to_dict"):
+        return o.to_dict()
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-lookup TTL and optional JSON-on-disk backing.
+
+    Entries keep their store time and free-form `meta` (e.g. HTTP validators),
+    so callers can also read stale entries and revalidate them. Values must be
+    JSON-serialisable when `disk_dir` is set.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0, disk_dir: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._data: "OrderedDict[str, Tuple[float, Any, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # ----------------- disk -----------------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def _load(self, key: str) -> Optional[Tuple[float, Any, Dict[str, Any]]]:
+        try:
+            with open(self._path(key), "r") as f:
+                raw = json.load(f)
+            if raw.get("key") != key:
+                return None
+            return raw["stored_at"], raw["value"], raw.get("meta") or {}
+        except Exception:
+            return None
+
+    def _dump(self, key: str, entry: Tuple[float, Any, Dict[str, Any]]) -> None:
+        tmp = self._path(key) + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"key": key, "stored_at": entry[0], "value": entry[1], "meta": entry[2]}, f,
+                          default=_to_json)
+            os.replace(tmp, self._path(key))
+        except Exception as e:
+            print("cache write failed:", e)
+
+    # ----------------- api -----------------
+
+    def get_entry(self, key: str) -> Optional[Tuple[float, Any, Dict[str, Any]]]:
+        """(stored_at, value, meta) for `key`, fresh or stale; None if unknown."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+                return entry
+        if not self.disk_dir:
+            return None
+        entry = self._load(key)
+        if entry is not None:
+            with self._lock:
+                self._put(key, entry)
+        return entry
+
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[Any]:
+        """Value if stored less than `ttl` (default self.ttl) seconds ago."""
+        entry = self.get_entry(key)
+        if entry is None:
+            return None
+        stored_at, value, _ = entry
+        return value if time.time() - stored_at < (self.ttl if ttl is None else ttl) else None
+
+    def set(self, key: str, value: Any, meta: Optional[Dict[str, Any]] = None) -> None:
+        entry = (time.time(), value, meta or {})
+        with self._lock:
+            self._put(key, entry)
+        if self.disk_dir:
+            self._dump(key, entry)
+
+    def touch(self, key: str) -> None:
+        """Mark an existing entry fresh again (e.g. after a 304 Not Modified)."""
+        entry = self.get_entry(key)
+        if entry is not None:
+            self.set(key, entry[1], entry[2])
+
+    def _put(self, key: str, entry: Tuple[float, Any, Dict[str, Any]]) -> None:
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()